@@ -3,19 +3,26 @@
 #----------------------------------------------------------------------
 
 import os
+import re
 import sys
 import json
+import time
+import functools
+import threading
 import requests
 from dotenv import load_dotenv
 import flask
 import oauthlib.oauth2
+import database
+import blocklist
 import user_queries as db
 
 #----------------------------------------------------------------------
 
 # Load in relevant Google IDs/URLs for authentication
 load_dotenv()
-GOOGLE_DISCOVERY_URL = (
+GOOGLE_DISCOVERY_URL = os.environ.get(
+    'GOOGLE_DISCOVERY_URL',
     'https://accounts.google.com/.well-known/openid-configuration'
 )
 
@@ -24,9 +31,120 @@ GOOGLE_CLIENT_ID_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
 
 REACT_FRONTEND = os.environ.get('REACT_FRONTEND')
 
+# Seconds a session trusts its cached identity (admin flag, blocked
+# status) before looking it up again. Blocking and unblocking revoke
+# it immediately, in every worker.
+IDENTITY_TTL = float(os.environ.get('AUTH_IDENTITY_TTL', 60))
+
+# Seconds to wait on Google before failing a login
+HTTP_TIMEOUT = float(os.environ.get('AUTH_HTTP_TIMEOUT', 10))
+
+# Lifetime of the discovery document when Google sends no max-age, and
+# how long before expiry a background refresh starts
+DISCOVERY_DEFAULT_TTL = 3600
+DISCOVERY_REFRESH_AHEAD = 0.1
+
 # Declare and initialize OAuth2 client
 client = oauthlib.oauth2.WebApplicationClient(GOOGLE_CLIENT_ID)
 
+# Keep-alive connections to Google shared by every outbound OAuth call,
+# so a login does not pay a TLS handshake per request. The adapter's
+# urllib3 pools are thread-safe; the sessions around it, with their
+# cookies and settings, are per thread.
+HTTP_POOL_SIZE = int(os.environ.get('AUTH_HTTP_POOL_SIZE', 10))
+_http_adapter = requests.adapters.HTTPAdapter(
+    pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+_http_local = threading.local()
+
+def _http_session() -> requests.Session:
+    """ Return this thread's session, mounted on the shared adapter """
+    session = getattr(_http_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.mount('https://', _http_adapter)
+        session.mount('http://', _http_adapter)
+        _http_local.session = session
+    return session
+
+#----------------------------------------------------------------------
+
+_MAX_AGE = re.compile(r'(?:^|,)\s*(?:s-)?max-age\s*=\s*"?(\d+)',
+                      re.IGNORECASE)
+
+_discovery = None
+_discovery_fetched_at = 0
+_discovery_expires_at = 0
+_discovery_lock = threading.Lock()
+_discovery_refreshing = False
+_discovery_retry_at = 0
+
+def _cache_lifetime(response: requests.Response) -> float:
+    """ Seconds a response may be reused, from its Cache-Control """
+    cache_control = response.headers.get('Cache-Control', '')
+    if re.search(r'no-cache|no-store', cache_control, re.IGNORECASE):
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    if not match:
+        return DISCOVERY_DEFAULT_TTL
+    age = int(response.headers.get('Age', 0) or 0)
+    return max(int(match.group(1)) - age, 0)
+
+def _fetch_discovery() -> dict:
+    """ Download the discovery document and cache it """
+    global _discovery, _discovery_fetched_at, _discovery_expires_at
+    response = _http_session().get(GOOGLE_DISCOVERY_URL,
+                                   timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    document = response.json()
+    now = time.monotonic()
+    _discovery, _discovery_fetched_at = document, now
+    _discovery_expires_at = now + _cache_lifetime(response)
+    return document
+
+def _refresh_discovery() -> None:
+    """ Refresh the discovery document off the request path """
+    global _discovery_refreshing, _discovery_retry_at
+    try:
+        _fetch_discovery()
+    except Exception as ex:
+        # Keep serving the old document; try again in a minute
+        print(f'auth.py: discovery refresh failed: {str(ex)}')
+        _discovery_retry_at = time.monotonic() + 60
+    finally:
+        _discovery_refreshing = False
+
+def get_provider_cfg() -> dict:
+    """ Get Google's OpenID discovery document, cached for as long as
+        its Cache-Control allows. Near or past expiry the cached copy is
+        still returned while a background thread refreshes it; only the
+        first login of a worker waits for the download.
+
+    Returns:
+        dict: Google's OpenID configuration
+    """
+    global _discovery_refreshing
+    now = time.monotonic()
+    if _discovery is None or _discovery_expires_at <= _discovery_fetched_at:
+        # Nothing usable cached (or caching forbidden): fetch inline
+        with _discovery_lock:
+            if (_discovery is not None
+                    and _discovery_expires_at > _discovery_fetched_at
+                    and _discovery_expires_at > now):
+                return _discovery
+            return _fetch_discovery()
+
+    lifetime = _discovery_expires_at - _discovery_fetched_at
+    refresh_at = _discovery_expires_at - lifetime * DISCOVERY_REFRESH_AHEAD
+    if now >= max(refresh_at, _discovery_retry_at):
+        with _discovery_lock:
+            start = not _discovery_refreshing
+            _discovery_refreshing = True
+        if start:
+            threading.Thread(target=_refresh_discovery,
+                             name='oidc-discovery-refresh',
+                             daemon=True).start()
+    return _discovery
+
 #----------------------------------------------------------------------
 
 def login() -> flask.Response:
@@ -36,7 +154,7 @@ def login() -> flask.Response:
         flask.Response: flask.redirect to Google 'Login'
     """
     # Determine URL for Google login
-    google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
+    google_provider_cfg = get_provider_cfg()
     auth_endpoint = (
         google_provider_cfg.get('authorization_endpoint')
     )
@@ -62,7 +180,7 @@ def callback() -> flask.Response:
     auth_code = flask.request.args.get('code')
     
     # Determine URL to fetch tokens to access user's profile data
-    google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
+    google_provider_cfg = get_provider_cfg()
     token_endpoint = google_provider_cfg.get('token_endpoint')
     
     # Construct request to fetch tokens
@@ -74,11 +192,12 @@ def callback() -> flask.Response:
     )
     
     # Fetch tokens from Google
-    token_response = requests.post(
+    token_response = _http_session().post(
         url = token_url,
         headers = headers,
         data = body,
-        auth = (GOOGLE_CLIENT_ID, GOOGLE_CLIENT_ID_SECRET)
+        auth = (GOOGLE_CLIENT_ID, GOOGLE_CLIENT_ID_SECRET),
+        timeout = HTTP_TIMEOUT
     )
     
     # Parse tokens from Google as JSON
@@ -89,26 +208,33 @@ def callback() -> flask.Response:
     # Using tokens, fetch the user's profile data 
     userinfo_endpoint = google_provider_cfg.get('userinfo_endpoint')
     uri, headers, body = client.add_token(userinfo_endpoint)
-    userinfo_response = requests.get(uri, headers = headers, 
-                                     data = body).json()
+    userinfo_response = _http_session().get(uri, headers = headers,
+                                            data = body,
+                                            timeout = HTTP_TIMEOUT).json()
     
+    # Drop any id or identity left by an earlier login in this browser
+    flask.session.pop('user_id', None)
+    flask.session.pop('identity', None)
     flask.session['email'] = userinfo_response.get('email')
     flask.session['name'] = userinfo_response.get('name')
     flask.session['picture'] = userinfo_response.get('picture')
 
+    identity = get_identity()
+
     # Check if the user is in the blacklist
-    if db.is_in_block(flask.session['email']):
+    if identity['blocked']:
         # Clear session and redirect user to a blocked page or notice
         flask.session.clear()
         return flask.redirect(f'{REACT_FRONTEND}/unauthorized')
 
-    user_details = db.get_user_details(flask.session['email'])
-    
-    if user_details:
+    if identity['user_id'] is not None:
+        # Resolved once here so queries can use the id directly
+        flask.session['user_id'] = identity['user_id']
+
         # If user exists, redirect them to the appropriate dashboard
-        if user_details['is_admin']:
+        if identity['is_admin']:
             return flask.redirect(f'{REACT_FRONTEND}/admin-dashboard')
-        elif user_details['is_admin'] is False:
+        else:
             return flask.redirect(f'{REACT_FRONTEND}/user-dashboard')
     else:
         # If user does not exists, redirect them to profile creation
@@ -116,6 +242,121 @@ def callback() -> flask.Response:
         
 #----------------------------------------------------------------------
 
+def get_identity() -> dict:
+    """ Get the logged in user's id, admin flag and blocked status.
+        Cached in the session for IDENTITY_TTL unless revoked, and
+        looked up at most once per request.
+
+    Returns:
+        dict: user_id (None without an account), is_admin and blocked
+    """
+    if '_identity' in flask.g:
+        return flask.g._identity
+
+    email = flask.session['email']
+    # A cached identity can only be revoked while this worker hears the
+    # others' invalidations; otherwise look it up every request
+    caching = database.tracks_changes()
+    cached = flask.session.get('identity') if caching else None
+    if (cached and cached['email'] == email
+            and time.time() - cached['checked_at'] < IDENTITY_TTL
+            and not database.changed_since(db.identity_key(email),
+                                           cached['checked_at'])):
+        identity = cached['identity']
+    else:
+        # Taken before the lookup, so a change committed during it
+        # still counts as newer
+        checked_at = time.time()
+        # Blocked users are rare; the database only confirms a hit in
+        # this worker's blocklist
+        identity = db.get_identity(
+            email, check_blocked=blocklist.might_be_blocked(email))
+        # Keep the session's id in step, e.g. after an admin deleted
+        # the account. Only changes are written, so an uncached lookup
+        # does not rewrite the session file every request.
+        if flask.session.get('user_id') != identity['user_id']:
+            if identity['user_id'] is None:
+                flask.session.pop('user_id', None)
+            else:
+                flask.session['user_id'] = identity['user_id']
+        if caching:
+            flask.session['identity'] = {
+                'email': email,
+                'identity': identity,
+                'checked_at': checked_at
+            }
+        elif 'identity' in flask.session:
+            flask.session.pop('identity')
+    flask.g._identity = identity
+    return identity
+
+def current_user_id() -> int:
+    """ Get the logged in user's id, stored in their session at login
+        or account creation. Sessions started before their account
+        existed resolve it through the identity lookup once.
+
+    Returns:
+        int: user_id, or None if the user has no account
+    """
+    user_id = flask.session.get('user_id')
+    if user_id is None:
+        user_id = get_identity()['user_id']
+        if user_id is not None:
+            flask.session['user_id'] = user_id
+    return user_id
+
+def _check_identity(admin: bool):
+    """ Reject requests without a logged in, unblocked user (and admin)
+
+    Returns:
+        tuple: JSON error and HTTP code, or None to let the request in
+    """
+    # Check if user is authenticated
+    if 'email' not in flask.session:
+        return flask.jsonify({
+            'status' : 'error',
+            'message' : 'User not authenticated.'
+        }), 401 # UNAUTHORIZED
+
+    try:
+        identity = get_identity()
+    # Error from database
+    except Exception as ex:
+        print(f'auth.py: {str(ex)}')
+        return flask.jsonify({
+            'status' : 'error',
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
+
+    if identity['blocked']:
+        # User is blacklisted; clear the session
+        flask.session.clear()
+        return flask.jsonify({'status': 'blocked'}), 403 # FORBIDDEN
+
+    # Check if user is authorized to perform action
+    if admin and not identity['is_admin']:
+        return flask.jsonify({
+            'status' : 'error',
+            'message' : 'User is not authorized!'
+        }), 403 # FORBIDDEN
+    return None
+
+def require_user(view):
+    """ Only let logged in users who are not blocked reach a handler """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return _check_identity(admin=False) or view(*args, **kwargs)
+    return wrapper
+
+def require_admin(view):
+    """ Only let logged in admins who are not blocked reach a handler """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return _check_identity(admin=True) or view(*args, **kwargs)
+    return wrapper
+
+#----------------------------------------------------------------------
+
 def logout() -> flask.Response:
     """ Log the user out from the flask session.  
 
@@ -145,12 +386,14 @@ def authenticate() -> tuple:
     
     # Check if the user has their email stored from logging in
     if 'email' in flask.session:
-        if db.is_in_block(flask.session['email']):
+        # Blocked status and authorization in one lookup
+        identity = get_identity()
+        if identity['blocked']:
             # User is blacklisted; clear the session and return Forbidden
             flask.session.clear()
             return flask.jsonify({'status': 'blocked'}), 403 # Forbidden
         
-        is_admin = db.get_user_authorization(flask.session['email'])
+        is_admin = identity['is_admin']
         
         # If user is not an admin
         if not is_admin:
@@ -0,0 +1,105 @@
+#----------------------------------------------------------------------
+# authenticate_latency.py: /authenticate latency with the blocked-user
+# check in the database versus in the in-process blocklist
+#
+# Runs three versions of the /authenticate handler against DATABASE_URL
+# with the session identity cache disabled, so every call looks the
+# user up:
+#   two queries   blocked_users EXISTS + is_admin lookup (the original)
+#   one query     get_identity with the blocked_users EXISTS
+#   blocklist     get_identity, blocked_users only on a blocklist hit
+#
+# Usage: python benchmarks/authenticate_latency.py [iterations] [email]
+#----------------------------------------------------------------------
+
+import os
+import sys
+import time
+import statistics
+import flask
+
+# Every request has to reach the identity lookup
+os.environ['AUTH_IDENTITY_TTL'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import blocklist
+import user_queries
+import auth
+
+#----------------------------------------------------------------------
+
+def authenticate_two_queries() -> tuple:
+    """ /authenticate as it was before the identity lookup """
+    email = flask.session['email']
+    with database.read() as cursor:
+        cursor.execute('''
+            SELECT EXISTS(
+                SELECT 1 FROM blocked_users WHERE email = %s
+            )
+        ''', (email, ))
+        if cursor.fetchone()[0]:
+            return flask.jsonify({'status': 'blocked'}), 403
+        cursor.execute('''
+            SELECT is_admin FROM users WHERE email = %s
+        ''', (email, ))
+        row = cursor.fetchone()
+    is_admin = row[0] if row else False
+    return flask.jsonify({'status': 'auth', 'is_admin': is_admin}), 200
+
+def authenticate_one_query() -> tuple:
+    """ /authenticate with the combined lookup, no blocklist """
+    identity = user_queries.get_identity(flask.session['email'])
+    if identity['blocked']:
+        return flask.jsonify({'status': 'blocked'}), 403
+    return flask.jsonify({'status': 'auth',
+                          'is_admin': identity['is_admin']}), 200
+
+def measure(client, path: str, iterations: int) -> list:
+    """ Time GET path, in ms per request """
+    for _ in range(20):
+        client.get(path)
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = client.get(path)
+        times.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            sys.exit(f'{path} answered {response.status_code}')
+    return times
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    app = flask.Flask(__name__)
+    app.secret_key = 'benchmark'
+    database.init_app(app)
+    blocklist.warm_up()
+    app.add_url_rule('/two-queries', view_func=authenticate_two_queries)
+    app.add_url_rule('/one-query', view_func=authenticate_one_query)
+    app.add_url_rule('/blocklist', view_func=auth.authenticate)
+
+    if len(sys.argv) > 2:
+        email = sys.argv[2]
+    else:
+        users = user_queries.get_all_user_details()
+        if not users:
+            sys.exit('No users in the database; pass an email')
+        email = users[0]['email']
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['email'] = email
+
+    print(f'/authenticate for {email}, {iterations} requests each')
+    for label, path in (('two queries', '/two-queries'),
+                        ('one query', '/one-query'),
+                        ('blocklist', '/blocklist')):
+        times = sorted(measure(client, path, iterations))
+        p95 = times[int(len(times) * 0.95) - 1]
+        print(f'  {label:<12} median {statistics.median(times):.3f} ms'
+              f'   p95 {p95:.3f} ms')
+    print(f'  blocklist: {blocklist.get_stats()}')
+
+if __name__ == '__main__':
+    main()
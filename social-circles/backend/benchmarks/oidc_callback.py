@@ -0,0 +1,165 @@
+#----------------------------------------------------------------------
+# oidc_callback.py: Login callback latency against a local stand-in
+# for Google's OpenID provider
+#
+# Serves a discovery document (Cache-Control: max-age=3600), a token
+# endpoint and a userinfo endpoint on localhost, each with an added
+# delay standing in for the round trip to Google, and times
+# auth.callback:
+#   before   discovery fetched on every call, a new connection per
+#            outbound request (plain requests.get/post)
+#   after    cached discovery document, per-thread sessions on a
+#            shared keep-alive connection pool
+# It also counts the TCP connections the provider accepted. The
+# stand-in speaks plain HTTP, so TLS handshakes saved by keep-alive
+# come on top of the numbers shown.
+#
+# The user lookup after the OAuth calls is replaced by a fixed identity
+# so that only the provider traffic is measured; no database is needed.
+#
+# Usage: python benchmarks/oidc_callback.py [iterations] [delay_ms]
+#----------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import threading
+import statistics
+import http.server
+import flask
+import requests
+
+# oauthlib refuses plain-HTTP token and userinfo endpoints otherwise
+os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#----------------------------------------------------------------------
+
+class Provider(http.server.ThreadingHTTPServer):
+    """ Minimal OpenID provider counting the connections it accepts """
+
+    daemon_threads = True
+
+    def __init__(self, delay: float):
+        super().__init__(('127.0.0.1', 0), ProviderHandler)
+        self.delay = delay
+        self.connections = 0
+        self.base = f'http://127.0.0.1:{self.server_address[1]}'
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+class ProviderHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed
+    # ACKs stall every response on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, document: dict, headers: dict = None) -> None:
+        time.sleep(self.server.delay)
+        body = json.dumps(document).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        base = self.server.base
+        if self.path == '/.well-known/openid-configuration':
+            self.send_json({
+                'issuer': base,
+                'authorization_endpoint': f'{base}/authorize',
+                'token_endpoint': f'{base}/token',
+                'userinfo_endpoint': f'{base}/userinfo'
+            }, {'Cache-Control': 'public, max-age=3600'})
+        elif self.path.startswith('/userinfo'):
+            self.send_json({
+                'email': 'standin@example.com',
+                'name': 'Stand In',
+                'picture': f'{base}/picture.png'
+            })
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/token':
+            self.send_json({
+                'access_token': 'standin-token',
+                'token_type': 'Bearer',
+                'expires_in': 3600,
+                'scope': 'openid email profile'
+            })
+        else:
+            self.send_error(404)
+
+def measure(client, iterations: int, before=None) -> list:
+    """ Time the login callback, in ms per call """
+    times = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = client.get('/login/callback?code=standin-code')
+        times.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 302:
+            sys.exit(f'callback answered {response.status_code}')
+    return times
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.005
+
+    provider = Provider(delay)
+    threading.Thread(target=provider.serve_forever, daemon=True).start()
+    os.environ['GOOGLE_DISCOVERY_URL'] = \
+        f'{provider.base}/.well-known/openid-configuration'
+    os.environ.setdefault('GOOGLE_CLIENT_ID', 'standin-client')
+    os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'standin-secret')
+
+    import auth
+
+    # Only the provider traffic is measured
+    auth.get_identity = lambda: {'user_id': 1, 'is_admin': False,
+                                 'blocked': False}
+
+    app = flask.Flask(__name__)
+    app.secret_key = 'benchmark'
+    app.add_url_rule('/login/callback', view_func=auth.callback)
+    client = app.test_client()
+
+    def forget_discovery():
+        auth._discovery = None
+
+    pooled = auth._http_session
+    results = {}
+    for label, session, before in (('before', lambda: requests,
+                                    forget_discovery),
+                                   ('after', pooled, None)):
+        auth._http_session = session
+        forget_discovery()
+        measure(client, 5, before)
+        connections = provider.connections
+        times = sorted(measure(client, iterations, before))
+        results[label] = (statistics.median(times),
+                          times[int(len(times) * 0.95) - 1],
+                          provider.connections - connections)
+
+    provider.shutdown()
+    print(f'login callback, {iterations} calls, '
+          f'{delay * 1000:.1f} ms provider delay')
+    for label, (median, p95, connections) in results.items():
+        print(f'  {label:<7} median {median:.2f} ms   p95 {p95:.2f} ms   '
+              f'{connections} connections')
+
+if __name__ == '__main__':
+    main()
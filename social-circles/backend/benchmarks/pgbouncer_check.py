@@ -0,0 +1,109 @@
+#----------------------------------------------------------------------
+# pgbouncer_check.py: Check that the data layer leaves no session state
+# behind when running through PgBouncer in transaction pooling mode
+#
+# Point DATABASE_URL at a local PgBouncer with pool_mode = transaction
+# and default_pool_size = 1, so every transaction shares one server
+# connection and any state left on it is seen by the next one.
+#
+# Usage: DB_PGBOUNCER=1 python benchmarks/pgbouncer_check.py
+#----------------------------------------------------------------------
+
+import os
+import sys
+import time
+import concurrent.futures
+import flask
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import event_queries
+import community_queries
+import user_queries
+
+#----------------------------------------------------------------------
+
+def server_state(conn) -> dict:
+    """ Read the session settings a leaked SET/PREPARE would change """
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            SELECT
+                current_setting('statement_timeout'),
+                current_setting('lock_timeout'),
+                current_setting('default_transaction_read_only'),
+                (SELECT COUNT(*) FROM pg_prepared_statements)
+        ''')
+        row = cursor.fetchone()
+    return {
+        'statement_timeout': row[0],
+        'lock_timeout': row[1],
+        'default_transaction_read_only': row[2],
+        'prepared_statements': row[3]
+    }
+
+def check(label: str, ok: bool, failures: list) -> None:
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    if not ok:
+        failures.append(label)
+
+def main():
+    if not database.PGBOUNCER:
+        sys.exit('Run with DB_PGBOUNCER=1 and DATABASE_URL set to PgBouncer')
+
+    failures = []
+    app = flask.Flask(__name__)
+    database.init_app(app)
+
+    probe = psycopg2.connect(database.DATABASE_URL)
+    probe.autocommit = True
+    before = server_state(probe)
+
+    print('Configuration')
+    check('prepared statements disabled', not database.USE_PREPARED,
+          failures)
+    check('no idle connections kept in reserve',
+          all(pool.stats()['size'] == 0 for pool in database._pools),
+          failures)
+
+    print('Reads and writes under a request deadline')
+    with app.test_request_context():
+        flask.g._db_deadline = time.monotonic() + 5
+        with database.read() as cursor:
+            cursor.execute("SELECT current_setting('statement_timeout')")
+            read_timeout = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT current_setting('transaction_read_only')")
+            read_only = cursor.fetchone()[0]
+        with database.transaction() as cursor:
+            cursor.execute("SELECT current_setting('statement_timeout')")
+            write_timeout = cursor.fetchone()[0]
+        user_id = user_queries.get_user_id('pgbouncer-check@example.com')
+        event_queries.get_available_events(user_id)
+        community_queries.get_all_communities(user_id)
+    check(f'read() timeout applied ({read_timeout})',
+          read_timeout != before['statement_timeout'], failures)
+    check('read() runs read only', read_only == 'on', failures)
+    check(f'transaction() timeout applied ({write_timeout})',
+          write_timeout != before['statement_timeout'], failures)
+
+    print('Concurrent query functions')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        calls = [executor.submit(event_queries.get_available_events, i)
+                 for i in range(50)]
+        errors = [call.exception() for call in calls if call.exception()]
+    check(f'50 listing queries, {len(errors)} errors', not errors, failures)
+
+    print('Server session state afterwards')
+    after = server_state(probe)
+    for key, value in before.items():
+        check(f'{key} unchanged ({after[key]})', after[key] == value,
+              failures)
+    probe.close()
+
+    if failures:
+        sys.exit(f'{len(failures)} check(s) failed')
+    print('All checks passed')
+
+if __name__ == '__main__':
+    main()
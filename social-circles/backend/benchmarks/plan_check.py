@@ -0,0 +1,362 @@
+#----------------------------------------------------------------------
+# plan_check.py: Catch query plan regressions in the *_queries modules
+#
+# Migrates and seeds a scratch schema in a local Postgres with
+# realistic volumes, runs every query function while capturing the SQL
+# it sends, and compares EXPLAIN (FORMAT JSON) of each statement with
+# the baselines in plan_baselines.json. Exits 1 when a plan changes
+# shape, its estimated cost grows past the tolerance, a statement has
+# no baseline or the baselines file is missing. The committed baselines
+# were generated on PostgreSQL 16 against the migrated schema.
+#
+# Usage: python benchmarks/plan_check.py [--update] [--cost-tolerance 0.2]
+#
+# PLAN_CHECK_DATABASE_URL names the database to use (never production:
+# the plan_check schema in it is dropped and rebuilt on every run).
+#----------------------------------------------------------------------
+
+import os
+import re
+import sys
+import json
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(BACKEND_DIR, 'benchmarks', 'plan_baselines.json')
+SCHEMA = 'plan_check'
+
+# Point the data layer at the scratch schema before it reads its config
+PLAN_CHECK_URL = os.environ.get('PLAN_CHECK_DATABASE_URL',
+                                'postgresql://localhost/social_circles')
+os.environ['DATABASE_URL'] = PLAN_CHECK_URL
+os.environ['PGOPTIONS'] = f'-c search_path={SCHEMA}'
+os.environ['DB_PREPARED_STATEMENTS'] = '0'
+# Every scenario has to reach the database
+os.environ['DB_CACHE'] = '0'
+
+sys.path.insert(0, BACKEND_DIR)
+import psycopg2
+import database
+import migrate
+import event_queries
+import community_queries
+import user_queries
+import resources_queries
+import user_dashboard_queries
+import visitor_queries
+
+#----------------------------------------------------------------------
+
+# Deterministic data at roughly production proportions; 400 past and
+# 100 upcoming events
+SEED_SQL = '''
+    INSERT INTO users (first_name, last_name, email, is_admin)
+    SELECT 'First' || i, 'Last' || i, 'user' || i || '@example.com', i <= 5
+    FROM generate_series(1, 5000) i;
+
+    INSERT INTO events (event_name, event_desc, start_time, end_time,
+                        capacity, image_link, location, is_dana_event)
+    SELECT 'Event ' || i, 'Description ' || i,
+        CURRENT_TIMESTAMP + (i - 400) * INTERVAL '1 day',
+        CURRENT_TIMESTAMP + (i - 400) * INTERVAL '1 day' + INTERVAL '2 hours',
+        100, 'https://example.com/' || i || '.png', 'Princeton', i % 10 = 0
+    FROM generate_series(1, 500) i;
+
+    INSERT INTO event_registrations (user_id, event_id)
+    SELECT DISTINCT u, (u * 7 + k * 31) % 500 + 1
+    FROM generate_series(1, 5000) u, generate_series(1, 8) k;
+
+    UPDATE events e SET filled_spots = (
+        SELECT COUNT(*) FROM event_registrations r
+        WHERE r.event_id = e.event_id);
+
+    INSERT INTO event_waitlists (user_id, event_id, timestamp)
+    SELECT u, (u * 13) % 500 + 1,
+        CURRENT_TIMESTAMP - u * INTERVAL '1 minute'
+    FROM generate_series(1, 2000) u;
+
+    INSERT INTO communities (group_name, group_desc, image_link)
+    SELECT 'Community ' || i, 'Description ' || i,
+        'https://example.com/c' || i || '.png'
+    FROM generate_series(1, 40) i;
+
+    INSERT INTO community_registrations (user_id, group_id)
+    SELECT DISTINCT u, (u * 3 + k * 11) % 40 + 1
+    FROM generate_series(1, 5000) u, generate_series(1, 3) k;
+
+    UPDATE communities c SET member_count = (
+        SELECT COUNT(*) FROM community_registrations r
+        WHERE r.group_id = c.group_id);
+
+    INSERT INTO announcements (announcement_name, description, image_link)
+    SELECT 'Announcement ' || i, 'Description ' || i,
+        'https://example.com/a' || i || '.png'
+    FROM generate_series(1, 20) i;
+
+    INSERT INTO resources (resource, disp_name, descrip)
+    SELECT 'https://example.com/r' || i, 'Resource ' || i, 'About ' || i
+    FROM generate_series(1, 60) i;
+
+    INSERT INTO blocked_users (first_name, last_name, email)
+    SELECT 'Blocked' || i, 'User' || i, 'blocked' || i || '@example.com'
+    FROM generate_series(1, 100) i;
+
+    INSERT INTO visitor_logs (session_id, timestamp)
+    SELECT 'session-' || (i % 20000),
+        CURRENT_TIMESTAMP - (i % 4320) * INTERVAL '1 minute'
+    FROM generate_series(1, 100000) i;
+
+    ANALYZE;
+'''
+
+EMAIL = 'user42@example.com'
+USER_ID = 42
+UPCOMING_EVENT = 450
+COMMUNITY = 7
+
+# Every query function with arguments matching the seed data. Writes
+# that remove rows come last so the reads see the full data set.
+SCENARIOS = [
+    (user_queries.get_user_id, EMAIL),
+    (user_queries.get_identity, EMAIL),
+    (user_queries.get_identity, EMAIL, False),
+    (user_queries.get_user_details, EMAIL),
+    (user_queries.get_all_user_details, ),
+    (user_queries.get_all_blocked_users, ),
+    (event_queries.get_upcoming_events, ),
+    (event_queries.get_available_events, USER_ID),
+    (event_queries.get_dana_events, USER_ID),
+    (event_queries.get_registered_events, USER_ID),
+    (event_queries.get_past_events, USER_ID),
+    (event_queries.get_event_name, UPCOMING_EVENT),
+    (event_queries.get_event_emails, UPCOMING_EVENT),
+    (event_queries.get_event_info, UPCOMING_EVENT, USER_ID),
+    (event_queries.get_users_for_event, UPCOMING_EVENT),
+    (event_queries.get_event_spots, UPCOMING_EVENT),
+    (event_queries.get_first_waitlist_user, (42 * 13) % 500 + 1),
+    (community_queries.get_community_metadata, ),
+    (community_queries.get_all_communities, USER_ID),
+    (community_queries.get_registered_communities, USER_ID),
+    (community_queries.get_community_emails, COMMUNITY),
+    (community_queries.get_community_info, COMMUNITY, USER_ID),
+    (community_queries.get_users_for_community, COMMUNITY),
+    (resources_queries.get_resources, ),
+    (user_dashboard_queries.get_announcements, ),
+    (visitor_queries.current_visitors, ),
+    (user_queries.add_user, {'first_name': 'New', 'last_name': 'User',
+                             'email': 'new@example.com'}),
+    (user_queries.update_user, {'email': EMAIL, 'pronouns': 'they/them'}),
+    (event_queries.add_event, {
+        'event_name': 'New event', 'event_desc': 'Description',
+        'capacity': 20, 'location': 'Princeton', 'isDanaEvent': False,
+        'image_link': '', 'start_time': '2030-01-01 10:00',
+        'end_time': '2030-01-01 12:00'}),
+    (event_queries.update_event, {'event_id': UPCOMING_EVENT,
+                                  'event_name': 'Renamed',
+                                  'isDanaEvent': 'unchanged'}),
+    (event_queries.add_event_registration, 43, UPCOMING_EVENT),
+    (event_queries.delete_event_registration, 43, UPCOMING_EVENT),
+    (event_queries.add_to_waitlist, 44, UPCOMING_EVENT),
+    (event_queries.remove_from_waitlist, 44, UPCOMING_EVENT),
+    (community_queries.add_community, {'group_name': 'New community',
+                                       'group_desc': 'Description',
+                                       'image_link': ''}),
+    (community_queries.update_community, {'group_id': COMMUNITY,
+                                          'group_name': 'Renamed'}),
+    (community_queries.add_community_registration, 43, COMMUNITY + 1),
+    (community_queries.delete_community_registration, 43,
+     COMMUNITY + 1),
+    (resources_queries.add_resources, {'resource': 'https://example.com',
+                                       'disp_name': 'New', 'descrip': ''}),
+    (resources_queries.update_resources, {'resource_id': 1,
+                                          'disp_name': 'Renamed'}),
+    (user_dashboard_queries.add_announcement, {
+        'announcement_name': 'New', 'description': '', 'image_link': ''}),
+    (user_dashboard_queries.update_announcement, {
+        'announcement_id': 1, 'announcement_name': 'Renamed'}),
+    (visitor_queries.log_visit, 'plan-check-session'),
+    (user_queries.remove_user_from_block, 'blocked1@example.com'),
+    (user_queries.block_and_delete_user, 'user4999@example.com'),
+    (user_queries.delete_user, 'user5000@example.com'),
+    (event_queries.delete_event, 500),
+    (community_queries.delete_community, 40),
+    (resources_queries.delete_resources, 60),
+    (user_dashboard_queries.delete_announcement, 20),
+    (visitor_queries.delete_expired_sessions_from_database, )
+]
+
+QUERY_MODULES = (event_queries, community_queries, user_queries,
+                 resources_queries, user_dashboard_queries, visitor_queries)
+
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b',
+                          re.IGNORECASE)
+
+#----------------------------------------------------------------------
+
+_captured = []
+
+class CapturingCursor(database.TimedCursor):
+    """ Cursor recording each statement with the query function that
+        sent it. Still a TimedCursor, which sends transaction()'s BEGIN. """
+
+    def execute(self, query, vars=None):
+        sql = self.mogrify(query, vars).decode()
+        if _EXPLAINABLE.match(sql):
+            frame = sys._getframe(1)
+            while frame is not None and not frame.f_globals.get(
+                    '__name__', '').endswith('_queries'):
+                frame = frame.f_back
+            if frame is not None:
+                _captured.append((f"{frame.f_globals['__name__']}."
+                                  f"{frame.f_code.co_name}", sql))
+        return super().execute(query, vars)
+
+def _capturing_connect(connect):
+    def wrapper(pool):
+        conn = connect(pool)
+        conn.cursor_factory = CapturingCursor
+        return conn
+    return wrapper
+
+database.ConnectionPool._connect = _capturing_connect(
+    database.ConnectionPool._connect)
+
+#----------------------------------------------------------------------
+
+def build_schema(conn) -> None:
+    """ Recreate the scratch schema from the migrations and seed it """
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+        migrate.get_applied(cursor)
+    for migration in migrate.load_migrations():
+        migrate.apply(conn, migration)
+    with conn.cursor() as cursor:
+        cursor.execute(SEED_SQL)
+
+def capture_statements() -> dict:
+    """ Run every scenario and collect the statements sent
+
+    Returns:
+        dict: 'module.function#n' -> SQL with parameters inlined
+    """
+    covered = {call[0].__name__ for call in SCENARIOS}
+    for module in QUERY_MODULES:
+        for name, func in vars(module).items():
+            if hasattr(func, '__wrapped__') and name not in covered:
+                print(f'  warning: {module.__name__}.{name} has no '
+                      f'scenario and is not checked')
+
+    statements = {}
+    # Numbered across scenarios, so a function run with different
+    # arguments keeps a baseline per call
+    counts = {}
+    for call in SCENARIOS:
+        _captured.clear()
+        try:
+            call[0](*call[1:])
+        except Exception as ex:
+            # Statements sent before the failure are still checked
+            print(f'  warning: {call[0].__module__}.{call[0].__name__} '
+                  f'failed: {str(ex)}')
+        for key, sql in _captured:
+            counts[key] = counts.get(key, 0) + 1
+            statements[f'{key}#{counts[key]}'] = sql
+    return statements
+
+def plan_shape(node: dict) -> str:
+    """ Describe a plan tree by node types and the relations/indexes
+        they read, ignoring estimates """
+    label = node['Node Type']
+    target = node.get('Index Name') or node.get('Relation Name')
+    if target:
+        label += f' on {target}'
+    children = node.get('Plans', [])
+    if children:
+        label += f" ({', '.join(plan_shape(child) for child in children)})"
+    return label
+
+def explain(conn, statements: dict) -> dict:
+    """ EXPLAIN every captured statement
+
+    Returns:
+        dict: key -> {'shape', 'cost', 'sql'}
+    """
+    plans = {}
+    with conn.cursor() as cursor:
+        for key, sql in statements.items():
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0][0]['Plan']
+            plans[key] = {
+                'shape': plan_shape(plan),
+                'cost': plan['Total Cost'],
+                'sql': ' '.join(sql.split())
+            }
+    return plans
+
+def compare(plans: dict, baselines: dict, tolerance: float) -> list:
+    """ Find plans that changed shape or got more expensive
+
+    Returns:
+        list: one message per regression
+    """
+    regressions = []
+    for key, plan in plans.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            regressions.append(f'{key}: no baseline')
+            continue
+        if plan['shape'] != baseline['shape']:
+            regressions.append(f"{key}: plan changed\n"
+                               f"    was: {baseline['shape']}\n"
+                               f"    now: {plan['shape']}")
+        elif plan['cost'] > baseline['cost'] * (1 + tolerance):
+            regressions.append(f"{key}: estimated cost "
+                               f"{baseline['cost']:.2f} -> "
+                               f"{plan['cost']:.2f}")
+    for key in baselines.keys() - plans.keys():
+        print(f'  note: {key} is no longer run; --update drops it')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare query plans against committed baselines')
+    parser.add_argument('--update', action='store_true',
+                        help='write the current plans as the baselines')
+    parser.add_argument('--cost-tolerance', type=float, default=0.2,
+                        help='allowed relative growth in estimated cost')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(PLAN_CHECK_URL)
+    conn.autocommit = True
+    print(f'Seeding schema {SCHEMA}')
+    build_schema(conn)
+
+    print('Capturing statements')
+    statements = capture_statements()
+    plans = explain(conn, statements)
+    conn.close()
+
+    if args.update:
+        with open(BASELINES, 'w', encoding='utf-8') as file:
+            json.dump(plans, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print(f'Wrote {len(plans)} baselines to {BASELINES}')
+        return
+
+    if not os.path.exists(BASELINES):
+        sys.exit(f'{BASELINES} is missing, so no plan can be checked; '
+                 f'run {sys.argv[0]} --update and commit it')
+    with open(BASELINES, encoding='utf-8') as file:
+        baselines = json.load(file)
+
+    regressions = compare(plans, baselines, args.cost_tolerance)
+    for regression in regressions:
+        print(f'  FAIL {regression}')
+    if regressions:
+        sys.exit(f'{len(regressions)} plan regression(s); if intended, '
+                 f'run {sys.argv[0]} --update and commit the baselines')
+    print(f'All {len(plans)} plans match their baselines')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#----------------------------------------------------------------------
+# prepared_statements.py: Planning time saved by preparing the user's
+# event status query used by get_available_events
+#
+# Usage: python benchmarks/prepared_statements.py [iterations]
+#----------------------------------------------------------------------
+
+import os
+import sys
+import time
+import statistics
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import event_queries
+
+#----------------------------------------------------------------------
+
+def planning_time(cursor, sql: str, params: tuple) -> float:
+    """ Run EXPLAIN ANALYZE and return the reported planning time (ms) """
+    cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+    return cursor.fetchone()[0][0]['Planning Time']
+
+def wall_time(cursor, sql: str, params: tuple) -> float:
+    """ Run a statement and return its round-trip time (ms) """
+    start = time.perf_counter()
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sql, body, _ = database._statements[event_queries.USER_EVENT_STATUS]
+
+    conn = psycopg2.connect(database.DATABASE_URL)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT user_id FROM users LIMIT 1')
+        row = cursor.fetchone()
+        if row is None:
+            sys.exit('No users in the database')
+        params = (row[0], )
+
+        cursor.execute(f'PREPARE bench_events AS {body}')
+        execute_sql = 'EXECUTE bench_events (%s)'
+
+        results = {}
+        for label, stmt in (('plain', sql), ('prepared', execute_sql)):
+            # Warm up caches (and let the generic plan kick in)
+            for _ in range(10):
+                wall_time(cursor, stmt, params)
+            plans = [planning_time(cursor, stmt, params)
+                     for _ in range(iterations)]
+            walls = [wall_time(cursor, stmt, params)
+                     for _ in range(iterations)]
+            results[label] = (statistics.mean(plans),
+                              statistics.median(walls))
+
+    conn.close()
+
+    print(f'get_available_events status query, {iterations} runs')
+    for label, (plan_ms, wall_ms) in results.items():
+        print(f'  {label:<9} planning {plan_ms:.3f} ms (mean)   '
+              f'round trip {wall_ms:.3f} ms (median)')
+    saved = results['plain'][0] - results['prepared'][0]
+    print(f'  planning time saved per call: {saved:.3f} ms')
+
+if __name__ == '__main__':
+    main()
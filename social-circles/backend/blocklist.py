@@ -0,0 +1,95 @@
+#----------------------------------------------------------------------
+# blocklist.py: In-process set of blocked emails for Social Circles
+#----------------------------------------------------------------------
+
+import time
+import hashlib
+import threading
+import database
+import user_queries as user_db
+
+#----------------------------------------------------------------------
+
+# Emails are kept as 64-bit digests: a few bytes per blocked user and
+# no addresses held in memory. A digest collision is only a false
+# positive, which the database then rules out.
+_digests = frozenset()
+_built_at = None
+_lock = threading.Lock()
+_stats = {'rebuilds': 0, 'negatives': 0, 'positives': 0, 'unverified': 0}
+
+def _digest(email: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(email.encode(), digest_size=8).digest(), 'big')
+
+def _rebuild() -> None:
+    """ Rebuild the set from the blocked users table. Callers hold
+        _lock, so only one rebuild runs at a time. """
+    global _digests, _built_at
+    # Taken before reading, so a block committed meanwhile still counts
+    # as newer than the set
+    built_at = time.time()
+    blocked = user_db.get_all_blocked_users()
+    _digests = frozenset(_digest(user['email']) for user in blocked)
+    _built_at = built_at
+    _stats['rebuilds'] += 1
+
+def warm_up() -> None:
+    """ Build the set at boot, ahead of the first login """
+    try:
+        with _lock:
+            _rebuild()
+    except Exception as ex:
+        print(f'blocklist.py: warm-up failed: {str(ex)}')
+
+def _is_current() -> bool:
+    """ Check that the set reflects every block committed since it was
+        built, rebuilding it once after one. Only one thread rebuilds;
+        the others are told the set is not current meanwhile. """
+    if not database.tracks_changes():
+        # Blocks in other workers would go unnoticed
+        return False
+    if _built_at is not None and not database.changed_since(
+            'blocked_users', _built_at):
+        return True
+    if not _lock.acquire(blocking=False):
+        return False
+    try:
+        # Another thread may have rebuilt it while this one checked
+        if _built_at is None or database.changed_since('blocked_users',
+                                                       _built_at):
+            _rebuild()
+        return True
+    except Exception as ex:
+        print(f'blocklist.py: rebuild failed: {str(ex)}')
+        return False
+    finally:
+        _lock.release()
+
+def might_be_blocked(email: str) -> bool:
+    """ Check the email against the set. While the set cannot be shown
+        to be current, e.g. without cross-worker invalidation, every
+        email might be blocked and the database decides.
+
+    Args:
+        email (str): email of the user
+
+    Returns:
+        bool: False if the user is certainly not blocked, True if the
+            database has to confirm
+    """
+    if not _is_current():
+        _stats['unverified'] += 1
+        return True
+    hit = _digest(email) in _digests
+    _stats['positives' if hit else 'negatives'] += 1
+    return hit
+
+def get_stats() -> dict:
+    """ Get the set's size and how often it answered without a query
+
+    Returns:
+        dict: entries, rebuilds, negatives, positives and unverified
+            (answered by the database because the set was not current)
+    """
+    return dict(_stats, entries=len(_digests))
@@ -3,8 +3,24 @@
 #----------------------------------------------------------------------
 
 import os
-import queue
+import re
+import sys
+import json
+import select
+import socket
+import random
+import functools
+import time
+import threading
+import itertools
+import collections
+import contextlib
+import concurrent.futures
+from datetime import datetime, timezone
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import flask
 from dotenv import load_dotenv
 
 #----------------------------------------------------------------------
@@ -12,27 +28,1929 @@ from dotenv import load_dotenv
 load_dotenv()
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+# Optional streaming replica serving read() blocks. A session that has
+# just written reads from the primary until the replica has replayed
+# its commit, waiting up to REPLICA_MAX_WAIT seconds for it first.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+REPLICA_MAX_WAIT = float(os.environ.get('DB_REPLICA_MAX_WAIT', 0.2))
+REPLICA_POLL_INTERVAL = 0.02
+# After failing to connect to the replica, read from the primary for
+# this many seconds before trying the replica again
+REPLICA_COOLDOWN = float(os.environ.get('DB_REPLICA_COOLDOWN', 30))
+
+# PgBouncer in transaction pooling mode gives each transaction whichever
+# server connection is free, so nothing may rely on session state: no
+# server-side prepared statements, no session-level SET, and reads run
+# as short READ ONLY transactions. PgBouncer does the real pooling, so
+# the in-process pool keeps no idle connections in reserve.
+PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0') == '1'
+
+# Pool sizing/health settings, tunable per deployment. Reads get their
+# own pool of read-only autocommit connections.
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 5))
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 0 if PGBOUNCER else 1))
+READ_POOL_MAX_SIZE = int(os.environ.get('DB_READ_POOL_MAX_SIZE', 10))
+READ_POOL_MIN_SIZE = int(os.environ.get('DB_READ_POOL_MIN_SIZE',
+                                        0 if PGBOUNCER else 2))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 30))
+
+# Leak detection: connections held longer than this are reported, and
+# connections a request never returned are reclaimed at teardown
+LEAK_THRESHOLD = float(os.environ.get('DB_LEAK_THRESHOLD', 30))
+LEAK_RECLAIM = os.environ.get('DB_LEAK_RECLAIM', '1') == '1'
+
+# Independent reads fanned out in parallel; kept below the read pool
+# size so a fan-out never starves the rest of the worker
+FAN_OUT_WORKERS = int(os.environ.get(
+    'DB_FAN_OUT_WORKERS', max(1, min(4, READ_POOL_MAX_SIZE - 1))))
+FAN_OUT_TIMEOUT = float(os.environ.get('DB_FAN_OUT_TIMEOUT', 10))
+
+# Every request gets a time budget, overridable per route with
+# @deadline(). The remaining budget caps pool waits and is applied to
+# Postgres as statement_timeout, with lock waits capped further still.
+REQUEST_DEADLINE = float(os.environ.get('DB_REQUEST_DEADLINE', 10))
+LOCK_TIMEOUT = float(os.environ.get('DB_LOCK_TIMEOUT', 2))
+# A session-level timeout set earlier in the request is kept until it
+# exceeds the remaining budget by more than this factor
+TIMEOUT_SLACK = 1.25
+
+# Query functions decorated with @retry are re-run after transient
+# errors, backing off with jitter while the request's budget allows
+RETRY_ATTEMPTS = int(os.environ.get('DB_RETRY_ATTEMPTS', 3))
+RETRY_BASE_DELAY = float(os.environ.get('DB_RETRY_BASE_DELAY', 0.05))
+RETRY_MAX_DELAY = float(os.environ.get('DB_RETRY_MAX_DELAY', 1))
+
+# Statements slower than this are logged with their caller, and a
+# sample of the slow SELECTs is re-run under EXPLAIN ANALYZE into a
+# ring buffer admins can download
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 250))
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.environ.get('DB_SLOW_QUERY_EXPLAIN_RATE', 0.1))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('DB_SLOW_QUERY_LOG_SIZE', 50))
+
+# Per-request query counts, connections and DB time. Statements run
+# this many times in one request are flagged as likely N+1 loops, and
+# the counts are sent back in X-DB-* headers when debug headers are on.
+REPEATED_QUERY_THRESHOLD = int(
+    os.environ.get('DB_REPEATED_QUERY_THRESHOLD', 5))
+DEBUG_HEADERS = os.environ.get('DB_DEBUG_HEADERS', '0') == '1'
+
+# Results of read-mostly query functions are cached in-process, LRU
+# bounded and expiring, and dropped when a write touches their tables
+CACHE_ENABLED = os.environ.get('DB_CACHE', '1') == '1'
+CACHE_MAX_ENTRIES = int(os.environ.get('DB_CACHE_MAX_ENTRIES', 1000))
+CACHE_TTL = float(os.environ.get('DB_CACHE_TTL', 300))
+
+# Concurrent misses for the same entry wait for one caller to fill it.
+# A waiter gives up after this many seconds and queries for itself.
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('DB_SINGLE_FLIGHT_TIMEOUT', 5))
+
+# Committed writes NOTIFY the tables they touched on this channel and
+# every worker's listener thread drops its own entries for them. LISTEN
+# needs a session, so behind PgBouncer it needs a direct URL.
+CACHE_CHANNEL = os.environ.get('DB_CACHE_CHANNEL', 'db_cache_invalidation')
+DATABASE_LISTEN_URL = os.environ.get(
+    'DATABASE_LISTEN_URL', None if PGBOUNCER else DATABASE_URL)
+
+# Statements carry a /* module.function */ comment naming the query
+# function that sent them, so pg_stat_statements can be traced back
+QUERY_TAGS = os.environ.get('DB_QUERY_TAGS', '1') == '1'
+
+# Hot statements are PREPAREd once per connection and run with EXECUTE.
+# PREPARE is session state, so PgBouncer mode always sends plain SQL.
+USE_PREPARED = (os.environ.get('DB_PREPARED_STATEMENTS', '1') == '1'
+                and not PGBOUNCER)
+
+#----------------------------------------------------------------------
+
+class PoolTimeout(Exception):
+    """ Raised when no connection frees up before the checkout timeout """
+
+class DeadlineExceeded(Exception):
+    """ Raised when a request runs out of time for database work """
+
+class PooledConnection(psycopg2.extensions.connection):
+    """ psycopg2 connection carrying the bookkeeping the pool needs """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+        self.pool = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checkout_wait = 0.0
+
+        # Who holds the connection, set on every checkout
+        self.checkout_id = None
+        self.checkout_site = None
+        self.checkout_thread = None
+        self.checkout_time = None
+        self.leak_reported = False
+
+        # Depth of nested transaction() blocks using the connection
+        self.txn_depth = 0
+
+        # Names of the statements PREPAREd on this session
+        self.prepared = set()
+
+        # Session-level statement_timeout (ms) read() left on the
+        # connection, and the checkout that set it
+        self.timeout_ms = None
+        self.timeout_checkout = None
+
+        # BEGIN/SET/RESET statements to send ahead of the next statement,
+        # and the session-level statement_timeout they leave behind
+        self.preamble = None
+        self.preamble_ms = None
+        self.preamble_session = False
+
+        # Tables written by the open transaction, invalidated on commit
+        self.written_tables = set()
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """ Cursor timing every statement; only slow ones cost more than
+        two clock reads. Statements are prefixed with the cursor's tag,
+        and the first one with the connection's pending preamble (BEGIN,
+        timeouts), so those ride along in the same round trip. """
+
+    tag = None
+
+    def execute(self, query, vars=None):
+        conn = self.connection
+        sql = query
+        if self.tag is not None and isinstance(query, str):
+            sql = f'/* {self.tag} */ {query}'
+        preamble = conn.preamble if isinstance(query, str) else None
+        if preamble is not None:
+            if vars is not None:
+                preamble = preamble.replace('%', '%%')
+            sql = f'{preamble}; {sql}'
+            conn.preamble = None
+        start = time.perf_counter()
+        result = super().execute(sql, vars)
+        elapsed = time.perf_counter() - start
+        if preamble is not None and conn.preamble_session:
+            # A failed message is rolled back whole, so only on success
+            conn.timeout_ms = conn.preamble_ms
+            conn.timeout_checkout = conn.checkout_id
+        for stats in _collectors():
+            stats.record_query(self.tag, query, elapsed)
+        if isinstance(query, str) and _in_transaction(conn):
+            conn.written_tables.update(_written_tables(query))
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _report_slow_query(self, query, vars, elapsed)
+        return result
+
+class ConnectionPool:
+    """ Bounded pool of psycopg2 connections.
+
+    At most max_size connections are ever open. Checkouts block until a
+    connection is returned or the timeout expires, idle connections are
+    pinged before reuse and connections older than max_lifetime are
+    replaced. A readonly pool opens read-only autocommit sessions, so
+    SELECTs never leave a transaction (and its snapshot) open. Behind
+    PgBouncer its connections instead start each transaction with
+    BEGIN READ ONLY, which leaves no setting on the server session.
+    Write connections are in autocommit too; transaction() sends BEGIN
+    and COMMIT itself, so both ride along with other statements.
+    """
+
+    def __init__(self, dsn: str, max_size: int, min_size: int,
+                 timeout: float, max_lifetime: float, ping_after: float,
+                 readonly: bool = False):
+        self._dsn = dsn
+        self.readonly = readonly
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._reset()
+
+        # Counters reported by stats()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._leaks = 0
+        self._reclaimed = 0
+        self._checkout_ids = itertools.count(1)
+
+    def _reset(self) -> None:
+        """ Start with no connections, owned by the current process """
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._checked_out = {}
+        self._size = 0
+        self._in_use = 0
+        self._waiters = 0
+
+    def _check_fork(self) -> None:
+        """ Drop connections inherited from the parent process, e.g.
+            opened by the warm-up before gunicorn --preload forked """
+        if self._pid == os.getpid():
+            return
+        with _fork_lock:
+            if self._pid == os.getpid():
+                return
+            # Closing them would end the parent's sessions too, so they
+            # are only kept referenced, never closed or used, here
+            _inherited.extend(self._idle)
+            _inherited.extend(self._checked_out.values())
+            self._reset()
+
+    def _connect(self) -> PooledConnection:
+        # Opened in the process using it, so the pid names the worker
+        # in pg_stat_activity and pg_stat_statements reports
+        conn = psycopg2.connect(self._dsn,
+                                connection_factory=PooledConnection,
+                                application_name=_application_name())
+        conn.pool = self
+        if self.readonly:
+            # Autocommit makes psycopg2 SET default_transaction_read_only
+            # on the session; without it READ ONLY goes in each BEGIN
+            conn.set_session(readonly=True, autocommit=not PGBOUNCER)
+        else:
+            conn.autocommit = True
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_expired(self, conn: PooledConnection) -> bool:
+        return time.monotonic() - conn.created_at > self.max_lifetime
+
+    def _is_alive(self, conn: PooledConnection) -> bool:
+        """ Check an idle connection with a round trip to the server """
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.ping_after:
+            return True
+        ping = 'SELECT 1'
+        if conn.timeout_ms is not None:
+            # Drop a timeout left by an earlier request in the same trip
+            ping = 'RESET statement_timeout; RESET lock_timeout; SELECT 1'
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(ping)
+            conn.rollback()
+            conn.timeout_ms = None
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn: PooledConnection) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._discarded += 1
+
+    def getconn(self, timeout: float = None) -> PooledConnection:
+        """ Check out a connection, blocking while the pool is exhausted
+
+        Args:
+            timeout (float): Seconds to wait for a free connection
+
+        Returns:
+            PooledConnection: Healthy connection to the database
+        """
+        self._check_fork()
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve a slot and open the connection unlocked
+                    self._size += 1
+                    break
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f'No database connection available after '
+                        f'{timeout:.1f}s ({self.max_size} in use)')
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            self._in_use += 1
+
+        try:
+            if conn is not None and (self._is_expired(conn)
+                                     or not self._is_alive(conn)):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            # Give the reserved slot back so waiters are not starved
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        conn.checkout_id = next(self._checkout_ids)
+        conn.checkout_site = _call_site()
+        conn.checkout_thread = threading.current_thread().name
+        conn.checkout_time = time.monotonic()
+        conn.leak_reported = False
+
+        waited = conn.checkout_time - start
+        conn.checkout_wait = waited
+        with self._cond:
+            self._checked_out[id(conn)] = conn
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return conn
+
+    def putconn(self, conn: PooledConnection, discard: bool = False) -> None:
+        """ Return a connection to the pool, closing it if unusable
+
+        Args:
+            conn (PooledConnection): Connection previously checked out
+            discard (bool): Close the connection instead of reusing it
+        """
+        self._check_fork()
+        with self._cond:
+            # Already reclaimed as a leak, or checked out by the parent
+            # process; the slot is not this pool's to free
+            if self._checked_out.pop(id(conn), None) is None:
+                return
+        conn.preamble = None
+        if not discard and not conn.closed:
+            # Never hand out a connection mid-transaction
+            try:
+                _rollback(conn)
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed or self._is_expired(conn):
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._in_use -= 1
+            self._cond.notify()
+
+    def is_checked_out(self, conn: PooledConnection,
+                       checkout_id: int) -> bool:
+        """ Check whether a particular checkout is still outstanding """
+        with self._cond:
+            return (id(conn) in self._checked_out
+                    and conn.checkout_id == checkout_id)
+
+    def find_leaks(self, threshold: float) -> list:
+        """ List connections held longer than the threshold, logging
+            each one the first time it is seen
+
+        Args:
+            threshold (float): Seconds after which a checkout is a leak
+
+        Returns:
+            list: list of dicts describing each suspected leak
+        """
+        now = time.monotonic()
+        with self._cond:
+            held = list(self._checked_out.values())
+        leaks = []
+        for conn in held:
+            held_for = now - conn.checkout_time
+            if held_for < threshold:
+                continue
+            leaks.append({
+                'site': conn.checkout_site,
+                'thread': conn.checkout_thread,
+                'held_for_s': round(held_for, 1)
+            })
+            if not conn.leak_reported:
+                conn.leak_reported = True
+                with self._cond:
+                    self._leaks += 1
+                print(f'database.py: connection held for {held_for:.1f}s, '
+                      f'checked out at {conn.checkout_site} '
+                      f'({conn.checkout_thread})')
+        return leaks
+
+    def reclaim(self, conn: PooledConnection) -> None:
+        """ Forcefully take back a connection its holder never returned
+
+        Args:
+            conn (PooledConnection): Leaked connection
+        """
+        print(f'database.py: reclaiming connection leaked at '
+              f'{conn.checkout_site}')
+        with self._cond:
+            self._reclaimed += 1
+        self.putconn(conn, discard=True)
+
+    def check_idle(self) -> None:
+        """ Ping every idle connection before its next checkout, e.g.
+            after one of them turned out to be broken """
+        with self._cond:
+            for conn in self._idle:
+                conn.last_used = float('-inf')
+
+    def warm_up(self) -> None:
+        """ Open min_size connections ahead of the first requests """
+        conns = []
+        try:
+            while len(conns) < self.min_size:
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def stats(self) -> dict:
+        """ Snapshot of the pool's occupancy and wait times
+
+        Returns:
+            dict: Live pool statistics
+        """
+        self._check_fork()
+        with self._cond:
+            return {
+                'readonly': self.readonly,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiters': self._waiters,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'total_wait_ms': round(self._total_wait * 1000, 2),
+                'avg_wait_ms': round(self._total_wait * 1000
+                                     / max(self._checkouts, 1), 2),
+                'max_wait_ms': round(self._max_wait * 1000, 2),
+                'leaks': self._leaks,
+                'reclaimed': self._reclaimed
+            }
+
+#----------------------------------------------------------------------
+
+def _caller_frame():
+    """ Find the first frame outside the database layer """
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get('__name__') in (
+            __name__, 'contextlib'):
+        frame = frame.f_back
+    return frame
+
+def _call_site() -> str:
+    """ Describe the first caller outside the database layer
+
+    Returns:
+        str: 'file:line in function' of the code checking out
+    """
+    frame = _caller_frame()
+    if frame is None:
+        return 'unknown'
+    return (f'{os.path.basename(frame.f_code.co_filename)}:'
+            f'{frame.f_lineno} in {frame.f_code.co_name}')
+
+def _caller_tag() -> str:
+    """ Name the query function running a block, for query tags
+
+    Returns:
+        str: 'module.function', or None if tagging is off
+    """
+    if not QUERY_TAGS:
+        return None
+    frame = _caller_frame()
+    if frame is None:
+        return None
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+def _application_name() -> str:
+    """ Identify this worker process to Postgres """
+    return f'social-circles/{socket.gethostname()}/{os.getpid()}'[:63]
+
+#----------------------------------------------------------------------
+
+# Connections a forked worker inherited; kept so they are never closed
+# (closing would terminate the parent's sessions)
+_inherited = []
+_fork_lock = threading.Lock()
+
 # Create Connection Pooling Functionality
-_connection_pool = queue.Queue(maxsize=15)
+_connection_pool = ConnectionPool(DATABASE_URL, POOL_MAX_SIZE,
+                                  POOL_MIN_SIZE, POOL_TIMEOUT,
+                                  POOL_MAX_LIFETIME, POOL_PING_AFTER)
+_read_pool = ConnectionPool(DATABASE_URL, READ_POOL_MAX_SIZE,
+                            READ_POOL_MIN_SIZE, POOL_TIMEOUT,
+                            POOL_MAX_LIFETIME, POOL_PING_AFTER,
+                            readonly=True)
+_replica_pool = None
+if DATABASE_REPLICA_URL:
+    _replica_pool = ConnectionPool(DATABASE_REPLICA_URL, READ_POOL_MAX_SIZE,
+                                   READ_POOL_MIN_SIZE, POOL_TIMEOUT,
+                                   POOL_MAX_LIFETIME, POOL_PING_AFTER,
+                                   readonly=True)
+_pools = tuple(pool for pool in (_connection_pool, _read_pool, _replica_pool)
+               if pool is not None)
+
+def _get_pool(readonly: bool, replica: bool) -> ConnectionPool:
+    """ Pick the pool serving a kind of connection """
+    if replica:
+        return _replica_pool
+    return _read_pool if readonly else _connection_pool
 
-def get_connection():
-    """ Retrieve connection from queue or create a new one
+def get_connection(readonly: bool = False, replica: bool = False):
+    """ Check out a connection from the pool, waiting if it is exhausted
+
+    Args:
+        readonly (bool): Check out a read-only autocommit connection
+        replica (bool): Check out a read-only connection to the replica
 
     Returns:
         psycopg2.connection: New/existing connection to the database
     """
-    try:
-        return _connection_pool.get_nowait()
-    except queue.Empty:
-        return psycopg2.connect(DATABASE_URL)
+    pool = _get_pool(readonly, replica)
+    remaining = _remaining()
+    if remaining is None or remaining >= pool.timeout:
+        conn = pool.getconn()
+    else:
+        try:
+            conn = pool.getconn(max(remaining, 0))
+        except PoolTimeout as ex:
+            raise _deadline_exceeded('waiting for a connection') from ex
+    for stats in _collectors():
+        stats.record_connection()
+    # Remember the request's checkouts so teardown can find leaks
+    if flask.has_request_context():
+        flask.g.setdefault('_db_checkouts', []).append(
+            (conn, conn.checkout_id))
+    return conn
 
-def put_connection(conn) -> None:
-    """ Put connection back into the queue or close it if queue is full
+def put_connection(conn, discard: bool = False) -> None:
+    """ Put connection back into its pool or close it if it is unusable
 
     Args:
         conn (psycopg2.connection): Existing connection to the database
+        discard (bool): Close the connection instead of reusing it
+    """
+    conn.pool.putconn(conn, discard)
+
+def warm_up() -> None:
+    """ Pre-open the pools' minimum connections at boot """
+    try:
+        for pool in _pools:
+            pool.warm_up()
+    except Exception as ex:
+        print(f'database.py: pool warm-up failed: {str(ex)}')
+
+def get_leak_report() -> list:
+    """ Get connections held past the leak threshold
+
+    Returns:
+        list: list of dicts with call site, thread and hold time
+    """
+    return [leak for pool in _pools
+            for leak in pool.find_leaks(LEAK_THRESHOLD)]
+
+_REQUEST_KEYS = {
+    (False, False): '_db_write_conn',
+    (True, False): '_db_read_conn',
+    (True, True): '_db_replica_conn'
+}
+
+def _request_connection(readonly: bool, replica: bool = False):
+    """ Get the connection reused by every block in the current
+        request, checking it out on first use
+
+    Args:
+        readonly (bool): Whether to use the read-only connection
+        replica (bool): Whether to use the replica connection
+
+    Returns:
+        tuple: (connection, whether it is request-scoped)
+    """
+    if not flask.has_request_context():
+        return get_connection(readonly, replica), False
+
+    key = _REQUEST_KEYS[(readonly, replica)]
+    conn = flask.g.get(key)
+    if conn is not None and conn.closed:
+        # Broken earlier in the request; discard it and start over
+        put_connection(conn)
+        conn = None
+    if conn is None:
+        conn = get_connection(readonly, replica)
+        setattr(flask.g, key, conn)
+    return conn, True
+
+def _teardown_request(exc) -> None:
+    """ Release the request's connections and reclaim any leaks """
+    for key in _REQUEST_KEYS.values():
+        conn = flask.g.pop(key, None)
+        if conn is not None:
+            put_connection(conn)
+
+    for conn, checkout_id in flask.g.pop('_db_checkouts', []):
+        if not conn.pool.is_checked_out(conn, checkout_id):
+            continue
+        if LEAK_RECLAIM:
+            conn.pool.reclaim(conn)
+        else:
+            print(f'database.py: request leaked connection checked out '
+                  f'at {conn.checkout_site}')
+
+    # Surface long-held connections from threads outside requests too
+    get_leak_report()
+
+def init_app(app: flask.Flask) -> None:
+    """ Hook the pool into the Flask app's lifecycle
+
+    Args:
+        app (flask.Flask): Social Circles application
+    """
+    app.before_request(_start_deadline)
+    app.before_request(_start_request_stats)
+    app.before_request(_start_cache_listener)
+    app.after_request(_deadline_response)
+    app.after_request(_report_request_stats)
+    app.register_error_handler(DeadlineExceeded, _handle_deadline_exceeded)
+    app.teardown_request(_teardown_request)
+    _log_cache_mode()
+    warm_up()
+
+def get_pool_stats() -> dict:
+    """ Get live statistics for the write, read and replica pools
+
+    Returns:
+        dict: Connections in use/idle, waiters and wait times per pool,
+            plus the retry and cache counters
+    """
+    stats = {
+        'write': _connection_pool.stats(),
+        'read': _read_pool.stats()
+    }
+    if _replica_pool is not None:
+        stats['replica'] = _replica_pool.stats()
+    stats['retries'] = get_retry_stats()
+    stats['cache'] = get_cache_stats()
+    return stats
+
+#----------------------------------------------------------------------
+
+# Session key holding the primary's WAL position after the session's
+# last write, cleared once the replica has replayed past it
+WAL_TOKEN_KEY = 'db_wal_lsn'
+
+# Replica routing and deadline of the request thread, for fan-out threads
+_routing = threading.local()
+
+def _parse_lsn(lsn: str) -> int:
+    """ Turn a pg_lsn such as '16/B374D848' into a comparable int """
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+def _record_write_position(lsn: str) -> None:
+    """ Give the session a read-your-writes token after a commit
+
+    Args:
+        lsn (str): Primary's WAL position read right after the commit
+    """
+    # The request's next reads go to the primary without asking the
+    # replica, which cannot have replayed the commit yet
+    flask.g._db_use_replica = False
+    token = flask.session.get(WAL_TOKEN_KEY)
+    if token is None or _parse_lsn(lsn) > _parse_lsn(token):
+        flask.session[WAL_TOKEN_KEY] = lsn
+
+def _replica_caught_up() -> bool:
+    """ Check whether the replica has replayed the session's last
+        write, polling for up to REPLICA_MAX_WAIT seconds. The poll
+        uses a connection of its own, returned before the request's
+        reads are routed, so a lagging replica holds nothing.
+
+    Returns:
+        bool: True if the session's reads can go to the replica
+    """
+    token = flask.session.get(WAL_TOKEN_KEY)
+    if token is None:
+        return True
+
+    target = _parse_lsn(token)
+    max_wait = REPLICA_MAX_WAIT
+    remaining = _remaining()
+    if remaining is not None:
+        max_wait = min(max_wait, remaining / 2)
+    deadline = time.monotonic() + max_wait
+    try:
+        conn = get_connection(readonly=True, replica=True)
+    except (psycopg2.OperationalError, PoolTimeout) as ex:
+        _replica_unavailable(ex)
+        return False
+    try:
+        while True:
+            with conn.cursor() as cursor:
+                _apply_deadline(conn)
+                cursor.execute('SELECT pg_last_wal_replay_lsn()')
+                replayed = cursor.fetchone()[0]
+            if not conn.autocommit:
+                conn.rollback()
+            # NULL means the server is not in recovery, i.e. not lagging
+            if replayed is None or _parse_lsn(replayed) >= target:
+                flask.session.pop(WAL_TOKEN_KEY, None)
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(REPLICA_POLL_INTERVAL)
+    except psycopg2.Error as ex:
+        _replica_unavailable(ex)
+        return False
+    finally:
+        put_connection(conn)
+
+_replica_down_until = 0.0
+
+def _replica_unavailable(ex: BaseException) -> None:
+    """ Send reads to the primary for REPLICA_COOLDOWN seconds after the
+        replica could not be reached. A pool timeout only means its
+        connections are busy, so it does not trip the cooldown. """
+    global _replica_down_until
+    if isinstance(ex, PoolTimeout):
+        print(f'database.py: replica pool busy, reading from primary: '
+              f'{str(ex)}')
+        return
+    _replica_down_until = time.monotonic() + REPLICA_COOLDOWN
+    print(f'database.py: replica unavailable, reading from primary for '
+          f'{REPLICA_COOLDOWN:.0f}s: {str(ex)}')
+
+def _use_replica() -> bool:
+    """ Decide whether read() blocks should go to the replica. Made
+        once per request; fan-out threads follow the request's choice.
+
+    Returns:
+        bool: True to read from the replica, False for the primary
+    """
+    if _replica_pool is None or getattr(_routing, 'force_primary', False):
+        return False
+    if time.monotonic() < _replica_down_until:
+        return False
+    if not flask.has_request_context():
+        return getattr(_routing, 'use_replica', True)
+
+    use_replica = flask.g.get('_db_use_replica')
+    if use_replica is None:
+        use_replica = _replica_caught_up()
+        flask.g._db_use_replica = use_replica
+    return use_replica
+
+#----------------------------------------------------------------------
+
+def deadline(seconds: float):
+    """ Give a route its own time budget instead of REQUEST_DEADLINE
+
+    Args:
+        seconds (float): Time allowed for the route's database work
+
+    Returns:
+        function: Decorator for the route's view function
+    """
+    def decorator(view):
+        view.db_deadline = seconds
+        return view
+    return decorator
+
+def _start_deadline() -> None:
+    """ Start the clock on the current request's budget """
+    view = flask.current_app.view_functions.get(flask.request.endpoint)
+    seconds = getattr(view, 'db_deadline', REQUEST_DEADLINE)
+    flask.g._db_deadline = time.monotonic() + seconds
+
+def _remaining() -> float:
+    """ Get the time left in the current request's budget
+
+    Returns:
+        float: Seconds left, or None outside a request
     """
+    if flask.has_request_context():
+        end = flask.g.get('_db_deadline')
+    else:
+        end = getattr(_routing, 'deadline', None)
+    if end is None:
+        return None
+    return end - time.monotonic()
+
+def _deadline_exceeded(doing: str) -> DeadlineExceeded:
+    """ Build the error for a blown budget and flag the request so
+        its response is turned into a 503 """
+    if flask.has_request_context():
+        flask.g._db_deadline_exceeded = True
+    return DeadlineExceeded(f'Request deadline exceeded {doing}')
+
+def _is_timeout(ex: BaseException) -> bool:
+    """ Check if Postgres cancelled a statement for our timeouts """
+    return (_remaining() is not None and isinstance(
+        ex, (psycopg2.errors.QueryCanceled,
+             psycopg2.errors.LockNotAvailable)))
+
+def _apply_deadline(conn, begin: bool = False) -> None:
+    """ Cap the statements of a block by the request's remaining
+        budget, failing fast if there is none left. The timeouts are
+        sent with the block's first statement rather than on their own.
+
+    Inside a transaction they are SET LOCAL, so they end with it. On
+    autocommit connections they are session settings: set once per
+    checkout, again only once the budget has shrunk well below them,
+    and reset by the next block run without a deadline (or the next
+    health check).
+
+    Args:
+        conn (psycopg2.connection): Connection the block runs on
+        begin (bool): Open a transaction with the block's first
+            statement, for transaction() on an autocommit connection
+    """
+    remaining = _remaining()
+    if remaining is not None and remaining <= 0:
+        raise _deadline_exceeded('before running a query')
+    conn.preamble_session = False
+    conn.preamble = 'BEGIN' if begin else None
+    if remaining is None:
+        if not begin and conn.autocommit and conn.timeout_ms is not None:
+            # Left by a request's read(); back to the server defaults
+            conn.preamble = 'RESET statement_timeout; RESET lock_timeout'
+            conn.preamble_ms = None
+            conn.preamble_session = True
+        return
+
+    statement_ms = max(1, int(remaining * 1000))
+    lock_ms = max(1, int(min(remaining, LOCK_TIMEOUT) * 1000))
+    if begin or not conn.autocommit:
+        timeouts = (f'SET LOCAL statement_timeout = {statement_ms}; '
+                    f'SET LOCAL lock_timeout = {lock_ms}')
+        conn.preamble = f'BEGIN; {timeouts}' if begin else timeouts
+        return
+    if (conn.timeout_checkout == conn.checkout_id
+            and conn.timeout_ms is not None
+            and conn.timeout_ms <= statement_ms * TIMEOUT_SLACK):
+        # Set by an earlier block of this checkout and still close enough
+        return
+    conn.preamble = (f'SET statement_timeout = {statement_ms}; '
+                     f'SET lock_timeout = {lock_ms}')
+    conn.preamble_ms = statement_ms
+    conn.preamble_session = True
+
+def _deadline_response(response: flask.Response) -> flask.Response:
+    """ Report requests that ran out of time as 503s, including
+        those whose handler caught the error and answered 500 """
+    if flask.g.get('_db_deadline_exceeded') and response.status_code == 500:
+        response = flask.jsonify({
+            'message' : 'Request timed out, please try again.'
+        })
+        response.status_code = 503 # SERVICE UNAVAILABLE
+    return response
+
+def _handle_deadline_exceeded(ex: DeadlineExceeded) -> tuple:
+    """ Answer requests that let DeadlineExceeded escape """
+    print(f'database.py: {str(ex)}')
+    return flask.jsonify({
+        'message' : 'Request timed out, please try again.'
+    }), 503 # SERVICE UNAVAILABLE
+
+#----------------------------------------------------------------------
+
+def _in_transaction(conn) -> bool:
+    """ Check if the connection has a transaction open, from libpq's
+        view of the session rather than psycopg2's """
+    return (conn.info.transaction_status !=
+            psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+def _rollback(conn) -> None:
+    """ Roll back the connection's open transaction, if any """
+    conn.preamble = None
+    if conn.closed:
+        return
+    if not conn.autocommit:
+        conn.rollback()
+    elif _in_transaction(conn):
+        # psycopg2 does not know of the BEGIN transaction() sent
+        with psycopg2.extensions.cursor(conn) as cursor:
+            cursor.execute('ROLLBACK')
+
+def _commit(conn, cursor) -> None:
+    """ COMMIT a transaction() in a single round trip. The NOTIFY for
+        other workers goes ahead of the COMMIT, and with a replica the
+        session's new WAL position is read right after it. """
+    tables, conn.written_tables = conn.written_tables, set()
+    if not _in_transaction(conn):
+        # The block ran no statement, so BEGIN was never sent
+        conn.preamble = None
+        return
+
+    sql = 'COMMIT'
+    if tables:
+        # Delivered to the other workers only if this commits
+        conn.preamble = _notify_sql(conn, tables)
+    record_position = (bool(tables) and _replica_pool is not None
+                       and flask.has_request_context())
+    if record_position:
+        sql += '; SELECT pg_current_wal_lsn()'
+    try:
+        cursor.execute(sql)
+    except psycopg2.Error as ex:
+        # The server may have committed before the connection dropped,
+        # or before the WAL position read failed, so the transaction
+        # must not be run again
+        if _is_connection_error(ex) or (record_position
+                                        and not _in_transaction(conn)):
+            ex.commit_unknown = True
+        raise
+    if record_position:
+        _record_write_position(cursor.fetchone()[0])
+    if tables:
+        invalidate_tables(tables)
+
+@contextlib.contextmanager
+def transaction():
+    """ Run a block of statements as one transaction. The transaction
+        is committed if the block succeeds and rolled back otherwise.
+        Blocks nested inside another transaction() join the outer one.
+
+    Yields:
+        psycopg2.cursor: Cursor on the request's write connection
+    """
+    conn, scoped = _request_connection(readonly=False)
+    conn.txn_depth += 1
+    try:
+        with conn.cursor() as cursor:
+            cursor.tag = _caller_tag()
+            if conn.txn_depth == 1:
+                _apply_deadline(conn, begin=True)
+            yield cursor
+            if conn.txn_depth == 1:
+                _commit(conn, cursor)
+    except BaseException as ex:
+        if conn.txn_depth == 1:
+            conn.written_tables = set()
+            try:
+                _rollback(conn)
+            except psycopg2.Error:
+                pass
+        if _is_timeout(ex):
+            raise _deadline_exceeded(f'in a transaction: {ex}') from ex
+        raise
+    finally:
+        conn.txn_depth -= 1
+        if not scoped:
+            # Rolls back anything left open and drops broken connections
+            put_connection(conn)
+
+@contextlib.contextmanager
+def read():
+    """ Run a block of read-only statements on a read-only autocommit
+        connection, so each SELECT ends its own transaction and no
+        snapshot is held once the block returns. Uses the replica when
+        one is configured and has caught up with the session's writes.
+
+    Yields:
+        psycopg2.cursor: Cursor on the request's read-only connection
+    """
+    conn = None
+    if _use_replica():
+        try:
+            conn, scoped = _request_connection(readonly=True, replica=True)
+        except (psycopg2.OperationalError, PoolTimeout) as ex:
+            _replica_unavailable(ex)
+            if flask.has_request_context():
+                flask.g._db_use_replica = False
+    if conn is None:
+        conn, scoped = _request_connection(readonly=True)
+    try:
+        with conn.cursor() as cursor:
+            cursor.tag = _caller_tag()
+            _apply_deadline(conn)
+            yield cursor
+    except BaseException as ex:
+        if _is_timeout(ex):
+            raise _deadline_exceeded(f'in a read: {ex}') from ex
+        raise
+    finally:
+        if not conn.autocommit and not conn.closed:
+            # Behind PgBouncer the block ran in a READ ONLY transaction;
+            # end it so the server connection goes back to PgBouncer
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        if not scoped:
+            # Drops the connection instead if it broke
+            put_connection(conn)
+
+#----------------------------------------------------------------------
+
+# Postgres error classes that end the connection: connection exceptions
+# and server shutdown/restart
+_CONNECTION_SQLSTATES = ('08', '57P01', '57P02', '57P03')
+
+_retry_stats = collections.Counter()
+_retry_lock = threading.Lock()
+_retry_state = threading.local()
+
+def _is_connection_error(ex: BaseException) -> bool:
+    """ Check if an error means the connection itself was lost """
+    if isinstance(ex, psycopg2.InterfaceError):
+        return True
+    if not isinstance(ex, psycopg2.OperationalError):
+        return False
+    # Errors raised by libpq itself (reset, refused) carry no SQLSTATE
+    if ex.pgcode is None:
+        return type(ex) is psycopg2.OperationalError
+    return ex.pgcode.startswith(_CONNECTION_SQLSTATES)
+
+def is_retryable(ex: BaseException) -> bool:
+    """ Classify an error as transient, i.e. the same work may succeed
+        if run again on a fresh transaction
+
+    Args:
+        ex (BaseException): Error raised by a query function
+
+    Returns:
+        bool: True for lost connections, serialization failures and
+            deadlocks, unless a commit may have gone through
+    """
+    if getattr(ex, 'commit_unknown', False):
+        return False
+    return isinstance(ex, (psycopg2.errors.SerializationFailure,
+                           psycopg2.errors.DeadlockDetected)) or \
+        _is_connection_error(ex)
+
+def _in_outer_transaction() -> bool:
+    """ Check if the caller runs inside an open transaction(), which
+        cannot be resumed after an error and so must not be retried """
+    if flask.has_request_context():
+        conn = flask.g.get('_db_write_conn')
+        if conn is not None and conn.txn_depth > 0:
+            return True
+    return getattr(_retry_state, 'depth', 0) > 1
+
+def _count_retry(outcome: str, ex: BaseException = None) -> None:
+    with _retry_lock:
+        _retry_stats[outcome] += 1
+        if ex is not None:
+            _retry_stats[f'{outcome}:{type(ex).__name__}'] += 1
+
+def retry(func):
+    """ Re-run a query function after transient database errors. Each
+        attempt runs its read()/transaction() blocks from scratch, so
+        reads are idempotent and transactions were rolled back; a
+        transaction whose commit outcome is unknown is never re-run.
+
+    Args:
+        func (function): Query function built on read()/transaction()
+
+    Returns:
+        function: The function wrapped with retries
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _retry_state.depth = getattr(_retry_state, 'depth', 0) + 1
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = func(*args, **kwargs)
+                    if attempt:
+                        _count_retry('recovered')
+                    return result
+                except Exception as ex:
+                    if not is_retryable(ex) or _in_outer_transaction():
+                        raise
+                    attempt += 1
+                    if _is_connection_error(ex):
+                        # Its neighbours probably broke at the same time
+                        for pool in _pools:
+                            pool.check_idle()
+
+                    delay = random.uniform(0, min(
+                        RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                    remaining = _remaining()
+                    if attempt >= RETRY_ATTEMPTS or (
+                            remaining is not None and remaining <= delay):
+                        _count_retry('exhausted', ex)
+                        raise
+                    _count_retry('retries', ex)
+                    print(f'database.py: retrying {func.__name__} after '
+                          f'{type(ex).__name__} (attempt {attempt + 1})')
+                    time.sleep(delay)
+        finally:
+            _retry_state.depth -= 1
+    return wrapper
+
+def get_retry_stats() -> dict:
+    """ Get counts of retried, recovered and exhausted query calls
+
+    Returns:
+        dict: outcome (and outcome:ErrorType) -> count
+    """
+    with _retry_lock:
+        return dict(_retry_stats)
+
+#----------------------------------------------------------------------
+
+_slow_queries = collections.deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+def _redact(params) -> list:
+    """ Keep the shape of query parameters but not their values,
+        except for numbers such as ids """
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        params = params.values()
+    return [param if isinstance(param, (int, float, bool)) or param is None
+            else f'<{type(param).__name__}>' for param in params]
+
+def _explain_slow_query(cursor, sql: str, params) -> list:
+    """ Re-run a slow SELECT under EXPLAIN (ANALYZE, BUFFERS)
+
+    Args:
+        cursor (TimedCursor): Cursor that ran the statement
+        sql (str): SELECT statement, with %s placeholders
+        params (tuple): Values for the placeholders
+
+    Returns:
+        list: the JSON plan, or None if it could not be captured
+    """
+    conn = cursor.connection
+    in_transaction = _in_transaction(conn)
+    # A plain cursor, so a slow EXPLAIN is not reported in turn
+    with psycopg2.extensions.cursor(conn) as explain_cursor:
+        try:
+            if in_transaction:
+                # A failed EXPLAIN must not abort the caller's transaction
+                explain_cursor.execute('SAVEPOINT slow_query_explain')
+            explain_cursor.execute(
+                f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+            plan = explain_cursor.fetchone()[0]
+            if in_transaction:
+                explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return plan
+        except psycopg2.Error as ex:
+            print(f'database.py: could not explain slow query: {str(ex)}')
+            if in_transaction and not conn.closed:
+                try:
+                    explain_cursor.execute(
+                        'ROLLBACK TO SAVEPOINT slow_query_explain')
+                except psycopg2.Error:
+                    pass
+            return None
+
+def _report_slow_query(cursor, query, params, elapsed: float) -> None:
+    """ Log a statement that took longer than SLOW_QUERY_MS and keep
+        it, with a sampled plan, in the slow query ring buffer """
+    sql = query.decode() if isinstance(query, bytes) else str(query)
+    conn = cursor.connection
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'caller': _call_site(),
+        'duration_ms': round(elapsed * 1000, 1),
+        'pool_wait_ms': round(getattr(conn, 'checkout_wait', 0) * 1000, 1),
+        'sql': ' '.join(sql.split()),
+        'params': _redact(params),
+        'plan': None
+    }
+
+    # EXECUTE of a prepared SELECT is explained through its original SQL
+    explain_sql, explain_params = sql, params
+    match = re.match(r'\s*EXECUTE (\w+)', sql)
+    if match and match.group(1) in _statements:
+        explain_sql = _statements[match.group(1)][0]
+    if (random.random() < SLOW_QUERY_EXPLAIN_RATE
+            and explain_sql.lstrip().upper().startswith('SELECT')
+            and conn.info.transaction_status !=
+            psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+        entry['plan'] = _explain_slow_query(cursor, explain_sql,
+                                            explain_params)
+
+    print(f"database.py: slow query {entry['duration_ms']:.0f} ms in "
+          f"{entry['caller']} (pool wait {entry['pool_wait_ms']:.0f} ms): "
+          f"{entry['sql'][:200]} {entry['params']}")
+    _slow_queries.append(entry)
+
+def get_slow_queries() -> list:
+    """ Get the most recent slow statements, newest first
+
+    Returns:
+        list: list of dicts with caller, timings, redacted parameters
+            and, for sampled SELECTs, the EXPLAIN ANALYZE plan
+    """
+    return list(reversed(_slow_queries))
+
+#----------------------------------------------------------------------
+
+class QueryStats:
+    """ Queries, connections and DB time counted over a request or an
+        assert_query_budget() block """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.connections = 0
+        self.db_time = 0.0
+        # (query function, statement) -> times run; the statement
+        # strings are mostly the same objects each call, so cheap keys
+        self._statements = collections.Counter()
+
+    def record_query(self, tag: str, query, elapsed: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            self._statements[(tag, query)] += 1
+
+    def record_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def repeated(self, threshold: int) -> list:
+        """ Find statement shapes run at least threshold times
+
+        Args:
+            threshold (int): Runs of one shape worth flagging
+
+        Returns:
+            list: (count, query function, shape) tuples, most run first
+        """
+        with self._lock:
+            statements = list(self._statements.items())
+        shapes = collections.Counter()
+        for (tag, query), count in statements:
+            shapes[(tag, _statement_shape(query))] += count
+        return [(count, tag, shape)
+                for (tag, shape), count in shapes.most_common()
+                if count >= threshold]
+
+def _statement_shape(query) -> str:
+    """ Normalize a statement so calls differing only in the length of
+        an IN (%s, %s, ...) list share a shape """
+    sql = query.decode() if isinstance(query, bytes) else str(query)
+    return re.sub(r'%s(\s*,\s*%s)+', '%s, ...', ' '.join(sql.split()))
+
+def _collectors() -> tuple:
+    """ Get the QueryStats the current thread's queries count toward
+
+    Returns:
+        tuple: the request's stats and any open query budgets
+    """
+    collectors = getattr(_routing, 'collectors', ())
+    if flask.has_request_context():
+        stats = flask.g.get('_db_stats')
+        if stats is not None:
+            collectors = collectors + (stats, )
+    return collectors
+
+def _start_request_stats() -> None:
+    """ Start counting the current request's database work """
+    flask.g._db_stats = QueryStats()
+
+def _report_request_stats(response: flask.Response) -> flask.Response:
+    """ Log repeated statements and add the debug headers """
+    stats = flask.g.get('_db_stats')
+    if stats is None:
+        return response
+
+    repeated = stats.repeated(REPEATED_QUERY_THRESHOLD)
+    for count, tag, shape in repeated:
+        print(f'database.py: {flask.request.method} {flask.request.path} '
+              f'ran {count}x in {tag}: {shape[:200]}')
+
+    if DEBUG_HEADERS:
+        response.headers['X-DB-Queries'] = str(stats.queries)
+        response.headers['X-DB-Connections'] = str(stats.connections)
+        response.headers['X-DB-Time-Ms'] = f'{stats.db_time * 1000:.1f}'
+        if repeated:
+            response.headers['X-DB-Repeated'] = '; '.join(
+                f'{count}x {tag or shape[:60]}'
+                for count, tag, shape in repeated)
+    return response
+
+@contextlib.contextmanager
+def assert_query_budget(max_queries: int, max_connections: int = None,
+                        max_repeats: int = None):
+    """ Fail if a block does more database work than budgeted, to pin
+        a route's query count in tests, e.g.
+
+            with database.assert_query_budget(3):
+                client.get('/get-available-events')
+
+    Args:
+        max_queries (int): Statements the block may run
+        max_connections (int): Connection checkouts the block may make
+        max_repeats (int): Times any one statement shape may run
+
+    Yields:
+        QueryStats: Counters for the block
+    """
+    stats = QueryStats()
+    previous = getattr(_routing, 'collectors', ())
+    _routing.collectors = previous + (stats, )
+    try:
+        yield stats
+    finally:
+        _routing.collectors = previous
+
+    problems = []
+    if stats.queries > max_queries:
+        problems.append(f'{stats.queries} queries (budget {max_queries})')
+    if max_connections is not None and stats.connections > max_connections:
+        problems.append(f'{stats.connections} connections '
+                        f'(budget {max_connections})')
+    if max_repeats is not None:
+        problems.extend(f'{count}x {tag}: {shape}' for count, tag, shape
+                        in stats.repeated(max_repeats + 1))
+    if problems:
+        raise AssertionError('Query budget exceeded: ' + '; '.join(problems))
+
+#----------------------------------------------------------------------
+
+# Registry of named statements, name -> (original SQL, PREPARE body)
+_statements = {}
+
+def prepare(name: str, sql: str) -> str:
+    """ Register a hot statement to be prepared server-side
+
+    Args:
+        name (str): Unique statement name, a valid SQL identifier
+        sql (str): Statement using %s placeholders
+
+    Returns:
+        str: The statement name, to pass to execute_prepared()
+    """
+    # Postgres PREPARE takes positional $n parameters instead of %s
+    parts = sql.split('%s')
+    body = parts[0] + ''.join(f'${i}{part}'
+                              for i, part in enumerate(parts[1:], 1))
+    if name in _statements and _statements[name][0] != sql:
+        raise ValueError(f'Statement {name} is already registered')
+    _statements[name] = (sql, body, len(parts) - 1)
+    return name
+
+def execute_prepared(cursor, name: str, params: tuple = ()) -> None:
+    """ Run a registered statement, PREPAREing it on first use on the
+        cursor's connection
+
+    Args:
+        cursor (psycopg2.cursor): Cursor from transaction()/read()
+        name (str): Name given to prepare()
+        params (tuple): Values for the statement's placeholders
+    """
+    sql, body, n_params = _statements[name]
+    if not USE_PREPARED:
+        cursor.execute(sql, params)
+        return
+
+    conn = cursor.connection
+    execute_sql = f'EXECUTE {name}'
+    if n_params:
+        execute_sql += f" ({', '.join(['%s'] * n_params)})"
+    if name not in conn.prepared:
+        cursor.execute(f'PREPARE {name} AS {body}')
+        conn.prepared.add(name)
+        cursor.execute(execute_sql, params)
+        return
+
+    try:
+        cursor.execute(execute_sql, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # The session lost its prepared statements (e.g. DISCARD ALL).
+        # Outside a transaction nothing was aborted, so re-prepare.
+        conn.prepared.clear()
+        if _in_transaction(conn):
+            raise
+        cursor.execute(f'PREPARE {name} AS {body}')
+        conn.prepared.add(name)
+        cursor.execute(execute_sql, params)
+
+#----------------------------------------------------------------------
+
+_IDENTIFIER = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+def pipeline(cursor, steps: list) -> dict:
+    """ Send a group of statements in a single round trip by running
+        them as the steps of one WITH query. A step can read the
+        RETURNING rows of any earlier step by its name. All steps see
+        the same snapshot, so a step never sees another step's changes
+        except through those RETURNING rows.
+
+    Args:
+        cursor (psycopg2.cursor): Cursor from transaction()/read()
+        steps (list): list of (name, sql, params) tuples; data-modifying
+            statements need a RETURNING clause
+
+    Returns:
+        dict: step name -> list of dicts, one per row the step returned
+    """
+    ctes = []
+    results = []
+    params = []
+    for name, sql, step_params in steps:
+        if not _IDENTIFIER.match(name):
+            raise ValueError(f'Invalid pipeline step name: {name}')
+        ctes.append(f'{name} AS ({sql})')
+        results.append(
+            f"(SELECT COALESCE(json_agg({name}), '[]') FROM {name})")
+        params.extend(step_params)
+
+    cursor.execute(f"WITH {', '.join(ctes)} SELECT {', '.join(results)}",
+                   tuple(params))
+    return dict(zip((step[0] for step in steps), cursor.fetchone()))
+
+#----------------------------------------------------------------------
+
+# Tables named after INSERT INTO / UPDATE / DELETE FROM, including the
+# data-modifying steps of a pipeline. A stray match (e.g. FOR UPDATE)
+# only costs an extra invalidation.
+_WRITE_TARGET = re.compile(
+    r'\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+(\w+)', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=1024)
+def _written_tables(query: str) -> frozenset:
+    """ Find the tables a statement writes to """
+    return frozenset(table.lower()
+                     for table in _WRITE_TARGET.findall(query))
+
+class QueryCache:
+    """ LRU cache of query function results, each entry tagged with
+        the tables it was read from """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expires_at, tables, value), least recently used first
+        self._entries = collections.OrderedDict()
+        self._keys_by_table = collections.defaultdict(set)
+        # Bumped on every invalidation, so a result computed while its
+        # tables changed is not stored
+        self._versions = collections.Counter()
+        # Wall-clock time of each table's last invalidation, for state
+        # cached outside this process (see changed_since). Anything
+        # older than _changed_floor is forgotten.
+        self._changed_at = {}
+        self._changed_floor = 0
+        self._stats = collections.Counter()
+
+    def get(self, key, count: bool = True):
+        """ Look up a live entry
+
+        Args:
+            key: Entry key
+            count (bool): Whether the lookup counts as a hit or miss
+
+        Returns:
+            tuple: (True, value) on a hit, (False, None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += count
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += count
+            return True, entry[2]
+
+    def versions(self, tables: tuple) -> tuple:
+        """ Snapshot the tables' versions before computing a value """
+        with self._lock:
+            return tuple(self._versions[table] for table in tables)
+
+    def put(self, key, tables: tuple, value, versions: tuple,
+            ttl: float = None) -> None:
+        """ Store a value unless its tables changed since versions() """
+        with self._lock:
+            if versions != tuple(self._versions[table] for table in tables):
+                self._stats['stale_puts'] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (expires_at, tables, value)
+            for table in tables:
+                self._keys_by_table[table].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key) -> None:
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._keys_by_table[table]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_table[table]
+
+    def invalidate(self, tables) -> None:
+        """ Drop every entry read from any of the tables """
+        with self._lock:
+            now = time.time()
+            for table in tables:
+                self._versions[table] += 1
+                self._changed_at.pop(table, None)
+                self._changed_at[table] = now
+                for key in list(self._keys_by_table.get(table, ())):
+                    self._remove(key)
+                    self._stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        """ Drop every entry """
+        with self._lock:
+            for table in list(self._versions) + list(self._keys_by_table):
+                self._versions[table] += 1
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self._changed_at.clear()
+            self._changed_floor = time.time()
+            self._stats['flushes'] += 1
+
+    def changed_since(self, table: str, when: float) -> bool:
+        """ Check if a table may have been invalidated after a wall-clock
+            time. Errs towards True once the history is forgotten. """
+        with self._lock:
+            # Oldest first; keep the history bounded like the entries
+            while len(self._changed_at) > self.max_entries:
+                oldest = next(iter(self._changed_at))
+                self._changed_floor = max(self._changed_floor,
+                                          self._changed_at.pop(oldest))
+            return (when <= self._changed_floor
+                    or self._changed_at.get(table, 0) >= when)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_rate'] = round(stats.get('hits', 0) / lookups, 3) \
+            if lookups else None
+        return stats
+
+_cache = QueryCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+class _Flight:
+    """ One in-flight computation and the outcome its waiters share """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+_flight_stats = collections.Counter()
+
+def single_flight(key, compute, timeout: float = None):
+    """ Run compute() once for all concurrent callers with the same key.
+        The first caller computes; the others wait and get its result,
+        or its exception re-raised.
+
+    Args:
+        key: Hashable identity of the computation
+        compute (function): Takes no arguments and returns the value
+        timeout (float): Seconds a waiter waits before computing on its
+            own, SINGLE_FLIGHT_TIMEOUT by default and never past the
+            request deadline
+
+    Returns:
+        The value compute() returned
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        _flight_stats['coalesced'] += 1
+        wait = SINGLE_FLIGHT_TIMEOUT if timeout is None else timeout
+        remaining = _remaining()
+        limited = remaining is not None and remaining <= wait
+        if limited:
+            wait = max(remaining, 0)
+        if not flight.done.wait(wait):
+            if limited:
+                raise _deadline_exceeded('waiting for a shared query')
+            _flight_stats['wait_timeouts'] += 1
+            print(f'database.py: gave up waiting {wait}s for {key!r}; '
+                  f'querying separately')
+            return compute()
+        if isinstance(flight.error, DeadlineExceeded):
+            # The leader's budget ran out; flag this request too
+            raise _deadline_exceeded('in a shared query')
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    _flight_stats['flights'] += 1
+    try:
+        flight.value = compute()
+        return flight.value
+    except BaseException as ex:
+        flight.error = ex
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+def cached(tables: tuple, ttl: float = None):
+    """ Cache a read-only query function's results by its arguments.
+        Results are shared between callers, who must not modify them.
+        Concurrent misses for the same arguments run the query once.
+
+    Args:
+        tables (tuple): Every table the function reads
+        ttl (float): Seconds an entry lives, CACHE_TTL by default
+
+    Returns:
+        function: Decorator for the query function
+    """
+    tables = tuple(table.lower() for table in tables)
+
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracks_changes():
+                return func(*args, **kwargs)
+            key = (name, args, tuple(sorted(kwargs.items())))
+            hit, value = _cache.get(key)
+            if hit:
+                return value
+            return single_flight(key, lambda: fill(key, args, kwargs))
+
+        def fill(key, args, kwargs):
+            # A flight that finished just before this one began has
+            # already stored the value
+            hit, value = _cache.get(key, count=False)
+            if hit:
+                return value
+
+            versions = _cache.versions(tables)
+            # Fill from the primary: a lagging replica could store data
+            # older than an invalidation that already happened
+            force_primary = getattr(_routing, 'force_primary', False)
+            _routing.force_primary = True
+            try:
+                value = func(*args, **kwargs)
+            finally:
+                _routing.force_primary = force_primary
+            _cache.put(key, tables, value, versions, ttl)
+            return value
+        return wrapper
+    return decorator
+
+def invalidate_on_commit(cursor, *tables) -> None:
+    """ Invalidate extra keys when the transaction() commits, in this
+        worker and through NOTIFY in the others, as if the statements
+        had written tables by those names. Lets state cached outside
+        the query cache (e.g. in sessions) be revoked with changed_since.
+
+    Args:
+        cursor (psycopg2.cursor): Cursor from transaction()
+        tables (str): Keys to invalidate
+    """
+    cursor.connection.written_tables.update(
+        table.lower() for table in tables)
+
+def changed_since(table: str, when: float) -> bool:
+    """ Check if a table or invalidate_on_commit() key may have changed
+        after a wall-clock time, in any worker. True whenever this worker
+        cannot tell, e.g. while it is not hearing other workers.
+
+    Args:
+        table (str): Table name or key
+        when (float): time.time() when the state was read
+
+    Returns:
+        bool: False only if the state read at when is still current
+    """
+    if not tracks_changes():
+        return True
+    return _cache.changed_since(table.lower(), when)
+
+def tracks_changes() -> bool:
+    """ Check if this worker hears every worker's invalidations, which
+        the query cache and changed_since() depend on
+
+    Returns:
+        bool: False while cached state cannot be trusted, e.g. with
+            DB_CACHE=0, without DATABASE_LISTEN_URL or while the
+            listener is reconnecting
+    """
+    return CACHE_ENABLED and _listener_healthy()
+
+def invalidate_tables(tables) -> None:
+    """ Drop cached results read from any of the tables
+
+    Args:
+        tables (iterable): Names of tables that were written
+    """
+    _cache.invalidate(tables)
+
+def _notify_sql(conn, tables) -> str:
+    """ Build the NOTIFY telling other workers which tables changed,
+        to send ahead of the COMMIT """
+    payload = json.dumps({'origin': _application_name(),
+                          'tables': sorted(tables)})
+    literals = []
+    for value in (CACHE_CHANNEL, payload):
+        literal = psycopg2.extensions.QuotedString(value)
+        literal.prepare(conn)
+        literals.append(literal.getquoted().decode())
+    return f'SELECT pg_notify({literals[0]}, {literals[1]})'
+
+def _apply_invalidation(payload: str) -> None:
+    """ Drop local entries named by another worker's NOTIFY """
+    try:
+        message = json.loads(payload)
+        if message['origin'] == _application_name():
+            return
+        invalidate_tables(message['tables'])
+    except (ValueError, KeyError, TypeError):
+        print(f'database.py: bad cache invalidation message: {payload}')
+        _cache.clear()
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+_listener_connected = threading.Event()
+
+def _listener_healthy() -> bool:
+    """ Check that this worker hears other workers' invalidations.
+        While its listener is down, cached() reads go to the database. """
+    return _listener_pid != os.getpid() or _listener_connected.is_set()
+
+def _start_cache_listener() -> None:
+    """ Start this worker's listener thread, once per process """
+    global _listener_pid
+    if _listener_pid == os.getpid() or not CACHE_ENABLED:
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        # Without a URL the cache stays off (see _log_cache_mode)
+        if DATABASE_LISTEN_URL:
+            threading.Thread(target=_listen_for_invalidations,
+                             name='db-cache-listener', daemon=True).start()
+        _listener_pid = os.getpid()
+
+def _log_cache_mode() -> None:
+    """ Say at startup when nothing is cached, so every query cache,
+        session identity and blocklist lookup goes to the database """
+    if not CACHE_ENABLED:
+        reason = 'DB_CACHE=0'
+    elif not DATABASE_LISTEN_URL:
+        reason = ('no DATABASE_LISTEN_URL, so this worker cannot hear '
+                  'other workers\' invalidations')
+    else:
+        return
+    print(f'database.py: {reason}; query results, session identities and '
+          f'the blocklist are not cached and every lookup queries the '
+          f'database')
+
+def _listen_for_invalidations() -> None:
+    """ Apply invalidations published by other workers, reconnecting
+        with backoff. Messages sent while disconnected are lost, so the
+        whole cache is flushed on every (re)connect. """
+    delay = 1
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_LISTEN_URL,
+                                    application_name=_application_name())
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CACHE_CHANNEL}')
+            _cache.clear()
+            _listener_connected.set()
+            delay = 1
+
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    # Quiet for a while; make sure the server is there
+                    with conn.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                conn.poll()
+                while conn.notifies:
+                    _apply_invalidation(conn.notifies.pop(0).payload)
+        except Exception as ex:
+            _listener_connected.clear()
+            print(f'database.py: cache listener disconnected, retrying '
+                  f'in {delay}s: {str(ex)}')
+            if conn is not None:
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+def get_cache_stats() -> dict:
+    """ Get hit/miss/eviction counters for the query cache
+
+    Returns:
+        dict: cache counters, current size, coalesced misses and whether
+            this worker is hearing other workers' invalidations
+    """
+    stats = _cache.stats()
+    stats['listening'] = tracks_changes()
+    stats['single_flight'] = dict(_flight_stats)
+    return stats
+
+#----------------------------------------------------------------------
+
+_fan_out_executor = None
+_fan_out_lock = threading.Lock()
+
+def _get_fan_out_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """ Create the fan-out threads on first use, after gunicorn forks """
+    global _fan_out_executor
+    with _fan_out_lock:
+        if _fan_out_executor is None:
+            _fan_out_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=FAN_OUT_WORKERS,
+                thread_name_prefix='db-fan-out')
+        return _fan_out_executor
+
+def _run_routed(use_replica: bool, end: float, collectors: tuple,
+                func, *args):
+    """ Run a fanned-out call with the submitting request's routing,
+        deadline and query counters """
+    _routing.use_replica = use_replica
+    _routing.deadline = end
+    _routing.collectors = collectors
+    try:
+        return func(*args)
+    finally:
+        del _routing.use_replica
+        del _routing.deadline
+        del _routing.collectors
+
+def fan_out(calls: list, timeout: float = None) -> list:
+    """ Run independent read queries at the same time, each on its own
+        pooled read connection
+
+    Args:
+        calls (list): list of (query function, *args) tuples
+        timeout (float): Seconds allowed for the whole set
+
+    Returns:
+        list: each call's result, in the order the calls were given
+    """
+    timeout = FAN_OUT_TIMEOUT if timeout is None else timeout
+    remaining = _remaining()
+    deadline_bound = remaining is not None and remaining < timeout
+    if deadline_bound:
+        timeout = max(remaining, 0)
+    end = None if remaining is None else time.monotonic() + remaining
+
+    executor = _get_fan_out_executor()
+    # Worker threads have no session, so hand them the request's choice
+    # of replica or primary to keep its reads consistent with its writes
+    use_replica = _use_replica()
+    collectors = _collectors()
+    futures = [executor.submit(_run_routed, use_replica, end, collectors,
+                               call[0], *call[1:])
+               for call in calls]
+
+    done, pending = concurrent.futures.wait(futures, timeout=timeout)
+    if pending:
+        for future in pending:
+            future.cancel()
+        if deadline_bound:
+            raise _deadline_exceeded(f'waiting for {len(pending)} of '
+                                     f'{len(calls)} queries')
+        raise TimeoutError(f'{len(pending)} of {len(calls)} queries did '
+                           f'not finish within {timeout:.1f}s')
+
+    # Re-raises the first failure, in call order
     try:
-        _connection_pool.put_nowait(conn)
-    except queue.Full:
-        conn.close()
\ No newline at end of file
+        return [future.result() for future in futures]
+    except DeadlineExceeded:
+        # Raised on a worker thread, which could not flag the request
+        raise _deadline_exceeded('in a fanned-out query')
@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------
+# diagnostics.py: Flask methods for database diagnostics requests
+#----------------------------------------------------------------------
+
+import flask
+import database
+import diagnostics_queries as diag_db
+import auth
+
+#----------------------------------------------------------------------
+
+@auth.require_admin
+def _admin_report(get_report) -> tuple:
+    """ Return a diagnostics report to an authenticated admin
+
+    Args:
+        get_report (callable): Function producing the report
+
+    Returns:
+        tuple: JSON containing the report and HTTP code
+    """
+    try:
+        return flask.jsonify({
+            'results' : get_report()
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'diagnostics.py: {str(ex)}')
+        return flask.jsonify({
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
+
+def get_pool_stats() -> tuple:
+    """ Return live statistics for the database connection pool
+
+    Returns:
+        tuple: JSON containing pool statistics and HTTP code
+    """
+    return _admin_report(database.get_pool_stats)
+
+def get_leak_report() -> tuple:
+    """ Return connections held longer than the leak threshold
+
+    Returns:
+        tuple: JSON containing suspected leaks and HTTP code
+    """
+    return _admin_report(database.get_leak_report)
+
+def get_slow_queries() -> tuple:
+    """ Return the slow query log, with sampled EXPLAIN ANALYZE plans,
+        as a downloadable JSON file
+
+    Returns:
+        tuple: JSON containing slow queries and HTTP code
+    """
+    response, code = _admin_report(database.get_slow_queries)
+    if code == 200:
+        response.headers['Content-Disposition'] = \
+            'attachment; filename=slow-queries.json'
+    return response, code
+
+def get_top_statements() -> tuple:
+    """ Return the most expensive statements from pg_stat_statements,
+        with the query function issuing each one
+
+    Returns:
+        tuple: JSON containing statement rankings and HTTP code
+    """
+    return _admin_report(diag_db.get_top_statements)
@@ -0,0 +1,113 @@
+#----------------------------------------------------------------------
+# diagnostics_queries.py: SQL Queries for database diagnostics
+#----------------------------------------------------------------------
+
+import re
+import database as db
+
+#----------------------------------------------------------------------
+
+# Comment database.py puts in front of every statement it sends
+_QUERY_TAG = re.compile(r'^\s*/\* ([\w.]+) \*/\s*')
+
+# Rankings in the report, in the order of the rank columns queried
+_ORDERINGS = ('total_time', 'mean_time', 'calls', 'rows')
+
+@db.retry
+def get_top_statements(limit: int = 10) -> dict:
+    """ Get the most expensive statements from pg_stat_statements,
+        each mapped back to the query function that sends it
+
+    Args:
+        limit (int): Number of statements in each ranking
+
+    Returns:
+        dict: rankings by total time, mean time, calls and rows, plus
+            the app's worker connections
+    """
+    with db.read() as cursor:
+        # Server versions before 13 name the timing columns differently
+        cursor.execute('''
+            SELECT
+                EXISTS (
+                    SELECT 1
+                    FROM pg_attribute
+                    WHERE attrelid = 'pg_stat_statements'::regclass
+                        AND attname = 'total_exec_time'
+                )
+        ''')
+        prefix = 'exec_' if cursor.fetchone()[0] else ''
+
+        # Each statement's place in every ranking, keeping only those
+        # in the top of at least one, so the view is never pulled whole
+        cursor.execute(f'''
+            WITH ranked AS (
+                SELECT
+                    s.query, s.calls, s.total_{prefix}time AS total_ms,
+                    s.mean_{prefix}time AS mean_ms, s.rows,
+                    row_number() OVER (
+                        ORDER BY s.total_{prefix}time DESC) AS total_rank,
+                    row_number() OVER (
+                        ORDER BY s.mean_{prefix}time DESC) AS mean_rank,
+                    row_number() OVER (ORDER BY s.calls DESC) AS calls_rank,
+                    row_number() OVER (ORDER BY s.rows DESC) AS rows_rank
+                FROM
+                    pg_stat_statements s
+                INNER JOIN
+                    pg_database d
+                ON
+                    s.dbid = d.oid
+                WHERE
+                    d.datname = current_database()
+            )
+            SELECT
+                query, calls, total_ms, mean_ms, rows,
+                total_rank, mean_rank, calls_rank, rows_rank
+            FROM
+                ranked
+            WHERE
+                LEAST(total_rank, mean_rank, calls_rank, rows_rank) <= %s
+        ''', (limit, ))
+        rows = cursor.fetchall()
+
+        # Which gunicorn workers are connected, by application_name
+        cursor.execute('''
+            SELECT
+                application_name, state, COUNT(*)
+            FROM
+                pg_stat_activity
+            WHERE
+                datname = current_database()
+                AND application_name LIKE 'social-circles/%'
+            GROUP BY
+                application_name, state
+            ORDER BY
+                application_name, state
+        ''')
+        activity = cursor.fetchall()
+
+    rankings = {ordering: [] for ordering in _ORDERINGS}
+    for query, calls, total_ms, mean_ms, row_count, *ranks in rows:
+        match = _QUERY_TAG.match(query)
+        statement = {
+            'function': match.group(1) if match else None,
+            'query': _QUERY_TAG.sub('', query, count=1),
+            'calls': calls,
+            'total_ms': round(total_ms, 2),
+            'mean_ms': round(mean_ms, 2),
+            'rows': row_count
+        }
+        for ordering, rank in zip(_ORDERINGS, ranks):
+            if rank <= limit:
+                rankings[ordering].append((rank, statement))
+
+    report = {
+        f'top_by_{ordering}': [statement for _, statement in sorted(
+            ranked, key=lambda entry: entry[0])]
+        for ordering, ranked in rankings.items()
+    }
+    report['workers'] = [
+        {'application_name': name, 'state': state, 'connections': count}
+        for name, state, count in activity
+    ]
+    return report
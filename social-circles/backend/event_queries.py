@@ -2,480 +2,369 @@
 # event_queries.py: SQL Queries for Social Circles Events
 #----------------------------------------------------------------------
 
-import psycopg2
-from database import get_connection, put_connection
+import database as db
 
 #----------------------------------------------------------------------
-def get_available_events(email) -> list:
+
+# The user's registrations and waitlist spots, combined on every
+# dashboard load with the shared listing, prepared once per connection
+USER_EVENT_STATUS = db.prepare('user_event_status', '''
+    SELECT
+        ARRAY(
+            SELECT e_reg.event_id
+            FROM event_registrations e_reg
+            WHERE e_reg.user_id = users.user_id
+        ),
+        ARRAY(
+            SELECT e_wait.event_id
+            FROM event_waitlists e_wait
+            WHERE e_wait.user_id = users.user_id
+        )
+    FROM
+        users
+    WHERE
+        users.user_id = %s
+''')
+
+#----------------------------------------------------------------------
+
+# Positions of columns in get_upcoming_events() rows
+_IS_DANA_EVENT = 9
+_IS_FULL = 10
+
+# Short TTL: events drop out of the listing once they end, which no
+# write announces. Every registration updates filled_spots, so refills
+# are frequent and coalesced within each worker.
+@db.cached(('events', ), ttl=60)
+@db.retry
+def get_upcoming_events() -> list:
+    """ Get every upcoming event's details, shared by all users
+
+    Returns:
+        list: list of tuples containing upcoming events' details,
+            soonest first
+    """
+    with db.read() as cursor:
+        cursor.execute('''
+            SELECT
+                e.event_id, e.event_name, e.event_desc,
+                e.start_time, e.end_time, e.capacity,
+                e.filled_spots, e.image_link, e.location,
+                e.is_dana_event,
+                (e.filled_spots >= e.capacity) as is_full
+            FROM
+                events e
+            WHERE
+                e.end_time > CURRENT_TIMESTAMP
+            ORDER BY
+                e.start_time ASC
+        ''')
+        return cursor.fetchall()
+
+def _with_user_status(user_id: int, events: list) -> list:
+    """ Add the user's registration/waitlist status to listing rows
+
+    Args:
+        user_id (int): id of user sending the request
+        events (list): rows from get_upcoming_events()
+
+    Returns:
+        list: list of tuples in the column order of event_to_dict()
+    """
+    with db.read() as cursor:
+        db.execute_prepared(cursor, USER_EVENT_STATUS, (user_id, ))
+        status = cursor.fetchone()
+
+    # User is not in database
+    if not status:
+        return []
+
+    registered, waitlisted = set(status[0]), set(status[1])
+    return [event[:_IS_FULL] + (event[0] in registered,
+                                event[0] in waitlisted, event[_IS_FULL])
+            for event in events]
+
+@db.retry
+def get_available_events(user_id: int) -> list:
     """ Get all events and user's registration status from the database
 
     Args:
-        email (str): email of user sending the request 
+        user_id (int): id of user sending the request
 
     Returns:
         list: list of lists containing all events' details
     """
-    all_events = []
-    connection = get_connection()
-    try: 
-        with connection.cursor() as cursor: 
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # User is not in database
-            if not user_info:
-                put_connection(connection)
-                return all_events
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            # Get all upcoming  events' info from event table, including
-            # whether the user is registered/in waitlist for each event
-            cursor.execute('''
-                SELECT DISTINCT
-                    e.event_id, e.event_name, e.event_desc, 
-                    e.start_time, e.end_time, e.capacity, 
-                    e.filled_spots, e.image_link, e.location, 
-                    e.is_dana_event,
-                    (e_reg.user_id IS NOT NULL) as is_registered,
-                    (e_wait.user_id IS NOT NULL) as is_waitlisted,
-                    (e.filled_spots >= e.capacity) as is_full
-                FROM 
-                    events e
-                LEFT JOIN 
-                    event_registrations e_reg
-                    ON
-                        e.event_id = e_reg.event_id
-                        AND e_reg.user_id = %s
-                LEFT JOIN
-                    event_waitlists e_wait
-                    ON
-                        e.event_id = e_wait.event_id
-                        AND e_wait.user_id = %s
-                WHERE
-                    e.end_time > CURRENT_TIMESTAMP
-                ORDER BY
-                    e.start_time ASC
-            ''', (user_id, user_id, ))
-            
-            all_events = cursor.fetchall()
-    # Database error
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-        
-    return all_events
-
-def get_dana_events(email) -> list:
+    return _with_user_status(user_id, get_upcoming_events())
+
+@db.retry
+def get_dana_events(user_id: int) -> list:
     """ Get events Dana is participating in/hosting from database
-    
+
     Args:
-        email (str): email of user sending the request 
+        user_id (int): id of user sending the request
 
     Returns:
         list: list of lists containing all Dana events' details
     """
-    dana_events = []
-    connection = get_connection()
-    try: 
-        with connection.cursor() as cursor: 
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # User is not in database
-            if not user_info:
-                put_connection(connection)
-                return dana_events
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            # Retrieve Dana events' information, including
-            # whether the user is registered/in waitlist for each event
-            cursor.execute('''
-                SELECT DISTINCT
-                    e.event_id, e.event_name, e.event_desc, 
-                    e.start_time, e.end_time, e.capacity, 
-                    e.filled_spots, e.image_link, e.location, 
-                    e.is_dana_event,
-                    (e_reg.user_id IS NOT NULL) as is_registered,
-                    (e_wait.user_id IS NOT NULL) as is_waitlisted,
-                    (e.filled_spots >= e.capacity) as is_full
-                FROM 
-                    events e
-                LEFT JOIN 
-                    event_registrations e_reg
-                    ON
-                        e.event_id = e_reg.event_id
-                        AND e_reg.user_id = %s
-                LEFT JOIN
-                    event_waitlists e_wait
-                    ON
-                        e.event_id = e_wait.event_id
-                        AND e_wait.user_id = %s
-                WHERE
-                    e.end_time > CURRENT_TIMESTAMP AND
-                    e.is_dana_event = true
-                ORDER BY
-                    e.start_time ASC
-            ''', (user_id, user_id, ))
-            
-            all_events = cursor.fetchall()
-    # Database error
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-        
-    return all_events
-        
-def get_registered_events(email: str) -> list:
+    # Filtered from the shared listing; no query of its own
+    return _with_user_status(
+        user_id, [event for event in get_upcoming_events()
+                  if event[_IS_DANA_EVENT]])
+
+@db.retry
+def get_registered_events(user_id: int) -> list:
     """ Get events a user is registered for from the database
 
     Args:
-        email (str): email of user sending the request 
+        user_id (int): id of user sending the request
 
     Returns:
         list: list of lists containing registered events' details
     """
     registered_events = []
-    connection = get_connection()
-    try: 
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # User is not in database
-            if not user_info:
-                put_connection(connection)
-                return registered_events
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            # Retrieve registered events' information, including
-            # whether the user is registered/in waitlist for each event
-            cursor.execute('''
-                SELECT DISTINCT
-                        e.event_id, e.event_name, e.event_desc, 
-                        e.start_time, e.end_time, e.capacity, 
-                        e.filled_spots, e.image_link, e.location, 
-                        e.is_dana_event,
-                        (e_reg.user_id IS NOT NULL) as is_registered,
-                        (e_wait.user_id IS NOT NULL) as is_waitlisted,
-                        (e.end_time < CURRENT_TIMESTAMP) as in_past
-                FROM   
-                    events e
-                LEFT JOIN 
-                    event_registrations e_reg 
-                    ON 
-                        e.event_id = e_reg.event_id AND 
-                        e_reg.user_id = %s
-                LEFT JOIN
-                    event_waitlists e_wait
-                    ON
-                        e.event_id = e_wait.event_id AND 
-                        e_wait.user_id = %s
-                WHERE 
-                    e_reg.user_id = %s OR
+    with db.read() as cursor:
+        # Retrieve registered events' information, including
+        # whether the user is registered/in waitlist for each event
+        cursor.execute('''
+            SELECT DISTINCT
+                    e.event_id, e.event_name, e.event_desc,
+                    e.start_time, e.end_time, e.capacity,
+                    e.filled_spots, e.image_link, e.location,
+                    e.is_dana_event,
+                    (e_reg.user_id IS NOT NULL) as is_registered,
+                    (e_wait.user_id IS NOT NULL) as is_waitlisted,
+                    (e.end_time < CURRENT_TIMESTAMP) as in_past
+            FROM
+                events e
+            LEFT JOIN
+                event_registrations e_reg
+                ON
+                    e.event_id = e_reg.event_id AND
+                    e_reg.user_id = %s
+            LEFT JOIN
+                event_waitlists e_wait
+                ON
+                    e.event_id = e_wait.event_id AND
                     e_wait.user_id = %s
-                ORDER BY
-                    e.end_time DESC
-            ''', (user_id, user_id, user_id, user_id, ))
-            
-            registered_events = cursor.fetchall()
-    # Database error
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-        
+            WHERE
+                e_reg.user_id = %s OR
+                e_wait.user_id = %s
+            ORDER BY
+                e.end_time DESC
+        ''', (user_id, user_id, user_id, user_id, ))
+
+        registered_events = cursor.fetchall()
+
     return registered_events
 
-def get_past_events(email) -> list:
+@db.retry
+def get_past_events(user_id: int) -> list:
     past_events = []
-    connection = get_connection()
-    try: 
-        with connection.cursor() as cursor: 
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            if not user_info:
-                put_connection(connection)
-                return past_events
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            # Get past events' info from event table
-            cursor.execute('''
-                SELECT DISTINCT
-                    e.event_id, e.event_name, e.event_desc, 
-                    e.start_time, e.end_time, e.capacity, 
-                    e.filled_spots, e.image_link, e.location, 
-                    e.is_dana_event
-                FROM 
-                    events e
-                WHERE
-                    e.end_time < CURRENT_TIMESTAMP
-                ORDER BY
-                    e.end_time DESC
-            ''', (user_id, ))
-            
-            past_events = cursor.fetchall()
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-        
+    # Past events are the same for every logged in user
+    if user_id is None:
+        return past_events
+
+    with db.read() as cursor:
+        # Get past events' info from event table
+        cursor.execute('''
+            SELECT DISTINCT
+                e.event_id, e.event_name, e.event_desc,
+                e.start_time, e.end_time, e.capacity,
+                e.filled_spots, e.image_link, e.location,
+                e.is_dana_event
+            FROM
+                events e
+            WHERE
+                e.end_time < CURRENT_TIMESTAMP
+            ORDER BY
+                e.end_time DESC
+        ''')
+
+        past_events = cursor.fetchall()
+
     return past_events
 
+@db.retry
 def add_event(args: dict) -> None:
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            event_name = args.get('event_name')
-            event_desc = args.get('event_desc')
-            capacity = args.get('capacity')
-            location = args.get('location')
-            is_dana_event = args.get('isDanaEvent')
-            image_link = args.get('image_link')
-            start_time = args.get('start_time')
-            end_time = args.get('end_time')
-            
-            values = (event_name, event_desc, capacity, location,
-                      is_dana_event, image_link, start_time,
-                      end_time)
-            
-            cursor.execute('''
-                INSERT INTO 
-                    events (event_id, event_name, event_desc, capacity, 
-                            location, is_dana_event, filled_spots, 
-                            image_link, start_time, end_time)                        
-                VALUES 
-                    (DEFAULT, %s, %s, %s, %s, %s, 0, %s, %s, %s);               
-            ''', values)
-            connection.commit()
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-
+    with db.transaction() as cursor:
+        event_name = args.get('event_name')
+        event_desc = args.get('event_desc')
+        capacity = args.get('capacity')
+        location = args.get('location')
+        is_dana_event = args.get('isDanaEvent')
+        image_link = args.get('image_link')
+        start_time = args.get('start_time')
+        end_time = args.get('end_time')
+
+        values = (event_name, event_desc, capacity, location,
+                  is_dana_event, image_link, start_time,
+                  end_time)
+
+        cursor.execute('''
+            INSERT INTO
+                events (event_id, event_name, event_desc, capacity,
+                        location, is_dana_event, filled_spots,
+                        image_link, start_time, end_time)
+            VALUES
+                (DEFAULT, %s, %s, %s, %s, %s, 0, %s, %s, %s);
+        ''', values)
+
+@db.retry
 def update_event(args: dict) -> None:
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            event_id = args.get('event_id')
-            event_name = args.get('event_name')
-            event_desc = args.get('event_desc')
-            capacity = args.get('capacity')
-            location = args.get('location')
-            is_dana_event = args.get('isDanaEvent')
-            image_link = args.get('image_link')
-            start_time = args.get('start_time')
-            end_time = args.get('end_time')
-            
-            sql_query_base = "UPDATE events SET "
-            values = []
-
-            if event_name:
-                sql_query_base += "event_name = %s, "
-                values.append(event_name)
-            if event_desc:
-                sql_query_base += "event_desc = %s, "
-                values.append(event_desc)
-            if capacity is not None:
-                sql_query_base += "capacity = %s, "
-                values.append(capacity)
-            if location:
-                sql_query_base += "location = %s, "
-                values.append(location)
-            if is_dana_event != "unchanged":
-                sql_query_base += "is_dana_event = %s, "
-                values.append(is_dana_event)
-            if image_link:
-                sql_query_base += "image_link = %s, "
-                values.append(image_link)
-            if start_time:
-                sql_query_base += "start_time = %s, "
-                values.append(start_time)
-            if end_time:
-                sql_query_base += "end_time = %s, "
-                values.append(end_time)
-                
-            sql_query_base = sql_query_base[:-2]
-
-            sql_query_base += " WHERE event_id = %s"
-            values.append(event_id)
-
-            cursor.execute(sql_query_base, tuple(values))
-            connection.commit()
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-
+    with db.transaction() as cursor:
+        event_id = args.get('event_id')
+        event_name = args.get('event_name')
+        event_desc = args.get('event_desc')
+        capacity = args.get('capacity')
+        location = args.get('location')
+        is_dana_event = args.get('isDanaEvent')
+        image_link = args.get('image_link')
+        start_time = args.get('start_time')
+        end_time = args.get('end_time')
+
+        sql_query_base = "UPDATE events SET "
+        values = []
+
+        if event_name:
+            sql_query_base += "event_name = %s, "
+            values.append(event_name)
+        if event_desc:
+            sql_query_base += "event_desc = %s, "
+            values.append(event_desc)
+        if capacity is not None:
+            sql_query_base += "capacity = %s, "
+            values.append(capacity)
+        if location:
+            sql_query_base += "location = %s, "
+            values.append(location)
+        if is_dana_event != "unchanged":
+            sql_query_base += "is_dana_event = %s, "
+            values.append(is_dana_event)
+        if image_link:
+            sql_query_base += "image_link = %s, "
+            values.append(image_link)
+        if start_time:
+            sql_query_base += "start_time = %s, "
+            values.append(start_time)
+        if end_time:
+            sql_query_base += "end_time = %s, "
+            values.append(end_time)
+
+        sql_query_base = sql_query_base[:-2]
+
+        sql_query_base += " WHERE event_id = %s"
+        values.append(event_id)
+
+        cursor.execute(sql_query_base, tuple(values))
+
+@db.retry
 def delete_event(event_id: int) -> None:
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                DELETE FROM 
-                    events 
-                WHERE 
-                    event_id = %s
-            ''', (event_id, ))
-            connection.commit()
-    except Exception as ex:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-            
-    
-def add_event_registration(email: str, event_id: int):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
+    with db.transaction() as cursor:
+        cursor.execute('''
+            DELETE FROM
+                events
+            WHERE
+                event_id = %s
+        ''', (event_id, ))
+
+
+@db.retry
+def add_event_registration(user_id: int, event_id: int):
+    with db.transaction() as cursor:
+        # Look up the user, add the registration and take a spot in
+        # one round trip
+        results = db.pipeline(cursor, [
+            ('registrant', '''
                 SELECT
                     user_id
                 FROM
                     users
                 WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            values = (user_id, event_id)
-            
-            # Add event registration
-            cursor.execute('''
+                    users.user_id = %s
+            ''', (user_id, )),
+            ('registration', '''
                 INSERT INTO
-                    event_registrations (registr_id, user_id, 
-                                            event_id)
-                VALUES 
-                    (DEFAULT, %s, %s)              
-            ''', values)
-            
-            cursor.execute('''
-                UPDATE 
+                    event_registrations (user_id, event_id)
+                SELECT
+                    user_id, %s
+                FROM
+                    registrant
+                RETURNING
+                    registr_id
+            ''', (event_id, )),
+            ('spots', '''
+                UPDATE
                     events
-                SET 
+                SET
                     filled_spots = filled_spots + 1
-                WHERE 
+                WHERE
                     event_id = %s
+                    AND EXISTS (SELECT 1 FROM registration)
+                RETURNING
+                    filled_spots
             ''', (event_id, ))
-            
-            connection.commit()
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-
-def delete_event_registration(email: str, event_id: int):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
+        ])
+
+        if not results['registrant']:
+            raise ValueError("User not found.")
+
+@db.retry
+def delete_event_registration(user_id: int, event_id: int):
+    with db.transaction() as cursor:
+        # Look up the user, remove the registration and free its spot
+        # in one round trip
+        results = db.pipeline(cursor, [
+            ('registrant', '''
                 SELECT
                     user_id
                 FROM
                     users
                 WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            values = (user_id, event_id)
-            
-            cursor.execute('''
-                DELETE FROM 
+                    users.user_id = %s
+            ''', (user_id, )),
+            ('registration', '''
+                DELETE FROM
                     event_registrations
-                WHERE 
-                    user_id = %s AND event_id = %s             
-            ''', values)
-            
-            cursor.execute('''
-                UPDATE 
+                WHERE
+                    user_id IN (SELECT user_id FROM registrant)
+                    AND event_id = %s
+                RETURNING
+                    registr_id
+            ''', (event_id, )),
+            ('spots', '''
+                UPDATE
                     events
-                SET 
+                SET
                     filled_spots = GREATEST(0, filled_spots - 1)
-                WHERE 
+                WHERE
                     event_id = %s
+                    AND EXISTS (SELECT 1 FROM registration)
+                RETURNING
+                    filled_spots
             ''', (event_id, ))
-            
-            connection.commit()
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-        
+        ])
+
+        if not results['registrant']:
+            raise ValueError("User not found.")
+
+@db.retry
 def get_event_name(event_id: int) -> str:
     event_name = ""
-    connection = get_connection()
-    try: 
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    e.event_name
-                FROM          
-                    events e
-                WHERE
-                    e.event_id = %s     
-            ''', (event_id, ))
-            result = cursor.fetchone()
-            if result:
-                event_name = result[0]
-    except Exception as ex:
-        raise
+    with db.read() as cursor:
+        cursor.execute('''
+            SELECT
+                e.event_name
+            FROM
+                events e
+            WHERE
+                e.event_id = %s
+        ''', (event_id, ))
+        result = cursor.fetchone()
+        if result:
+            event_name = result[0]
     return event_name
 
+@db.retry
 def get_event_emails(event_id: int) -> list:
     """_summary_
 
@@ -486,116 +375,91 @@ def get_event_emails(event_id: int) -> list:
         list: _description_
     """
     event_emails = []
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    users.email
-                FROM 
-                    users
-                INNER JOIN 
-                    event_registrations 
-                ON 
-                    users.user_id = event_registrations.user_id
-                WHERE 
-                    event_registrations.event_id = %s;
-            ''', (event_id, ))
-            event_emails = cursor.fetchall()
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
+    with db.read() as cursor:
+        cursor.execute('''
+            SELECT
+                users.email
+            FROM
+                users
+            INNER JOIN
+                event_registrations
+            ON
+                users.user_id = event_registrations.user_id
+            WHERE
+                event_registrations.event_id = %s;
+        ''', (event_id, ))
+        event_emails = cursor.fetchall()
 
     return event_emails
 
-def get_event_info(event_id: int, user_email: str):
+@db.retry
+def get_event_info(event_id: int, user_id: int):
     event_info = {}
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # First, get the user_id from the user_email
-            cursor.execute('''
-                SELECT user_id FROM users WHERE email = %s;
-            ''', (user_email,))
-            user_result = cursor.fetchone()
-            if not user_result:
-                put_connection(connection)
-                return event_info  # No such user
-
-            user_id = user_result[0]
-
-            # Now, fetch the event details along with registration and waitlist status
-            cursor.execute('''
-                SELECT 
-                    e.event_id, e.event_name, e.event_desc, e.start_time, 
-                    e.end_time, e.capacity, e.filled_spots, e.image_link, 
-                    e.location, e.is_dana_event,
-                    (SELECT COUNT(*) 
-                        FROM 
-                            event_registrations er 
-                        WHERE 
-                            er.event_id = e.event_id AND er.user_id = %s) > 0 AS is_registered,
-                    (SELECT COUNT(*) 
-                        FROM event_waitlists ew 
-                            WHERE 
-                                ew.event_id = e.event_id AND ew.user_id = %s) > 0 AS is_waitlisted,
-                    e.filled_spots >= e.capacity AS is_full,
-                    (e.end_time < CURRENT_TIMESTAMP) as in_past
-                FROM 
-                    events e
-                WHERE 
-                    e.event_id = %s;
-            ''', (user_id, user_id, event_id))
-
-            event_info = cursor.fetchone()
-    except Exception as ex:
-        raise
-    finally:
-        put_connection(connection)
+    if user_id is None:
+        return event_info  # No such user
+
+    with db.read() as cursor:
+        # Fetch the event details along with registration and waitlist status
+        cursor.execute('''
+            SELECT
+                e.event_id, e.event_name, e.event_desc, e.start_time,
+                e.end_time, e.capacity, e.filled_spots, e.image_link,
+                e.location, e.is_dana_event,
+                (SELECT COUNT(*)
+                    FROM
+                        event_registrations er
+                    WHERE
+                        er.event_id = e.event_id AND er.user_id = %s) > 0 AS is_registered,
+                (SELECT COUNT(*)
+                    FROM event_waitlists ew
+                        WHERE
+                            ew.event_id = e.event_id AND ew.user_id = %s) > 0 AS is_waitlisted,
+                e.filled_spots >= e.capacity AS is_full,
+                (e.end_time < CURRENT_TIMESTAMP) as in_past
+            FROM
+                events e
+            WHERE
+                e.event_id = %s;
+        ''', (user_id, user_id, event_id))
+
+        event_info = cursor.fetchone()
     return event_info
 
 
+@db.retry
 def get_users_for_event(event_id):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Get all user IDs registered for the event
-            cursor.execute('''
-                SELECT 
-                    user_id
-                FROM 
-                    event_registrations
-                WHERE 
-                    event_id = %s;
-            ''', (event_id,))
-            rows = cursor.fetchall()
-
-            # If no users are found, return an empty list immediately
-            if not rows:
-                return []
-
-            # Extract user_ids from rows
-            user_ids = [row[0] for row in rows] 
-
-            # Prepare SQL query to retrieve details for registered users
-            placeholders = ', '.join(['%s'] * len(user_ids))
-            sql_query = f"SELECT * FROM users WHERE user_id IN ({placeholders})"
-            
-            cursor.execute(sql_query, tuple(user_ids))
-            user_info = cursor.fetchall()
-            return user_info
-    # Database error
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-        
+    with db.read() as cursor:
+        # Get all user IDs registered for the event
+        cursor.execute('''
+            SELECT
+                user_id
+            FROM
+                event_registrations
+            WHERE
+                event_id = %s;
+        ''', (event_id,))
+        rows = cursor.fetchall()
+
+        # If no users are found, return an empty list immediately
+        if not rows:
+            return []
+
+        # Extract user_ids from rows
+        user_ids = [row[0] for row in rows]
+
+        # Prepare SQL query to retrieve details for registered users
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        sql_query = f"SELECT * FROM users WHERE user_id IN ({placeholders})"
+
+        cursor.execute(sql_query, tuple(user_ids))
+        user_info = cursor.fetchall()
+        return user_info
+
 # ---------------------------------------------------------------------
 # Queries/Helper functions for WAITLIST functionality
 # ---------------------------------------------------------------------
 
+@db.retry
 def get_event_spots(event_id: int) -> list:
     """ Get filled spots and capacity for a particular event
 
@@ -606,103 +470,55 @@ def get_event_spots(event_id: int) -> list:
         list: list containing filled spots and capacity for the event
     """
     event_spots = []
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    e.filled_spots, e.capacity   
-                FROM
-                    events e
-                WHERE
-                    e.event_id = %s            
-            ''', (event_id,))
-            event_spots = cursor.fetchone()
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
+    with db.read() as cursor:
+        cursor.execute('''
+            SELECT
+                e.filled_spots, e.capacity
+            FROM
+                events e
+            WHERE
+                e.event_id = %s
+        ''', (event_id,))
+        event_spots = cursor.fetchone()
     return event_spots
 
-def add_to_waitlist(email: str, event_id: int) -> None:
+@db.retry
+def add_to_waitlist(user_id: int, event_id: int) -> None:
     """ Add a user to an event's waitlist
 
     Args:
-        email (str): email of the user to be added to the waitlist
+        user_id (int): id of the user to be added to the waitlist
         event_id (int): id of the event the waitlist is for
     """
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            values = (user_id, event_id)
-            
-            cursor.execute('''
-                INSERT INTO 
-                    event_waitlists (user_id, event_id)  
-                VALUES
-                    (%s, %s)             
-            ''', values)
-            connection.commit()
-    # Database error
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-    
-def remove_from_waitlist(email: str, event_id: int) -> None:
+    with db.transaction() as cursor:
+        values = (user_id, event_id)
+
+        cursor.execute('''
+            INSERT INTO
+                event_waitlists (user_id, event_id)
+            VALUES
+                (%s, %s)
+        ''', values)
+
+@db.retry
+def remove_from_waitlist(user_id: int, event_id: int) -> None:
     """ Remove a user from an event's waitlist
 
     Args:
-        email (str): email of the user to be removed from the waitlist
+        user_id (int): id of the user to be removed from the waitlist
         event_id (int): id of the event the waitlist is for
     """
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (email, ))
-            user_info = cursor.fetchone()
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-            
-            values = (user_id, event_id)
-            
-            cursor.execute('''
-                DELETE FROM
-                    event_waitlists
-                WHERE
-                    user_id = %s AND event_id = %s              
-            ''', values)
-            connection.commit()
-    except Exception:
-        connection.rollback()
-        raise
-    finally:
-        put_connection(connection)
-        
+    with db.transaction() as cursor:
+        values = (user_id, event_id)
+
+        cursor.execute('''
+            DELETE FROM
+                event_waitlists
+            WHERE
+                user_id = %s AND event_id = %s
+        ''', values)
+
+@db.retry
 def get_first_waitlist_user(event_id: int) -> str:
     """ Get the first user to have joined the waitlist for an event
 
@@ -713,32 +529,25 @@ def get_first_waitlist_user(event_id: int) -> str:
         str: email of the first user who joined the event's waitlist
     """
     waitlist_user_email = None
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve single user's email
-            cursor.execute('''
-                SELECT 
-                    u.email
-                FROM 
-                    event_waitlists e_wait
-                JOIN
-                    users u
-                    ON 
-                        e_wait.user_id = u.user_id
-                WHERE 
-                    e_wait.event_id = %s
-                ORDER BY 
-                    e_wait.timestamp ASC
-                LIMIT 
-                    1
-            ''', (event_id, ))
-            result = cursor.fetchone()
-            if result:
-                waitlist_user_email = result[0]
-    # Database error
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-    return waitlist_user_email
\ No newline at end of file
+    with db.read() as cursor:
+        # Retrieve single user's email
+        cursor.execute('''
+            SELECT
+                u.email
+            FROM
+                event_waitlists e_wait
+            JOIN
+                users u
+                ON
+                    e_wait.user_id = u.user_id
+            WHERE
+                e_wait.event_id = %s
+            ORDER BY
+                e_wait.timestamp ASC
+            LIMIT
+                1
+        ''', (event_id, ))
+        result = cursor.fetchone()
+        if result:
+            waitlist_user_email = result[0]
+    return waitlist_user_email
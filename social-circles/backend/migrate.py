@@ -0,0 +1,195 @@
+#----------------------------------------------------------------------
+# migrate.py: Apply the versioned schema migrations in migrations/
+#
+# Usage: python migrate.py [--status] [--target VERSION]
+#----------------------------------------------------------------------
+
+import os
+import re
+import sys
+import hashlib
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+
+#----------------------------------------------------------------------
+
+load_dotenv()
+
+# Migrations need a direct session (advisory lock, CONCURRENTLY), so
+# they can bypass PgBouncer with their own URL
+MIGRATION_URL = (os.environ.get('DATABASE_MIGRATION_URL')
+                 or os.environ.get('DATABASE_URL'))
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'migrations')
+
+# Arbitrary key held while migrating, so concurrent deploys queue up
+LOCK_KEY = 72_013_001
+
+# First line marker for migrations that cannot run in a transaction,
+# e.g. CREATE INDEX CONCURRENTLY. Their statements are run one at a time
+# in autocommit, split at semicolons.
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+_CONCURRENT_INDEX = re.compile(
+    r'^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+'
+    r'(?:IF\s+NOT\s+EXISTS\s+)?("[^"]+"|[\w.]+)', re.IGNORECASE)
+
+#----------------------------------------------------------------------
+
+class Migration:
+    """ One migrations/NNNN_name.sql file """
+
+    def __init__(self, path: str):
+        match = _FILENAME.match(os.path.basename(path))
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        with open(path, encoding='utf-8') as file:
+            self.sql = file.read()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+        self.transactional = not self.sql.startswith(NO_TRANSACTION)
+
+    def statements(self) -> list:
+        """ Split the migration into single statements
+
+        Returns:
+            list: SQL statements, without comments
+        """
+        lines = [line for line in self.sql.splitlines()
+                 if not line.strip().startswith('--')]
+        return [stmt.strip() for stmt in '\n'.join(lines).split(';')
+                if stmt.strip()]
+
+    def concurrent_indexes(self) -> list:
+        """ Get the indexes the migration builds CONCURRENTLY
+
+        Returns:
+            list: index names as written in the statements
+        """
+        return [match.group(1) for match in
+                (_CONCURRENT_INDEX.match(stmt) for stmt in self.statements())
+                if match]
+
+def load_migrations() -> list:
+    """ Read every migration file, ordered by version
+
+    Returns:
+        list: list of Migration objects
+    """
+    migrations = [Migration(os.path.join(MIGRATIONS_DIR, filename))
+                  for filename in os.listdir(MIGRATIONS_DIR)
+                  if _FILENAME.match(filename)]
+    migrations.sort(key=lambda migration: migration.version)
+
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError('Two migrations share a version number')
+    return migrations
+
+def get_applied(cursor) -> dict:
+    """ Get the migrations already applied to the database
+
+    Returns:
+        dict: version -> checksum
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('SELECT version, checksum FROM schema_migrations')
+    return dict(cursor.fetchall())
+
+def apply(conn, migration: Migration) -> None:
+    """ Run a migration and record it in schema_migrations
+
+    Args:
+        conn (psycopg2.connection): Autocommit connection to the database
+        migration (Migration): Migration to apply
+    """
+    record = '''
+        INSERT INTO schema_migrations (version, name, checksum)
+        VALUES (%s, %s, %s)
+    '''
+    values = (migration.version, migration.name, migration.checksum)
+
+    with conn.cursor() as cursor:
+        if migration.transactional:
+            cursor.execute('BEGIN')
+            try:
+                cursor.execute(migration.sql)
+                cursor.execute(record, values)
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return
+
+        for statement in migration.statements():
+            cursor.execute(statement)
+
+        # A failed CREATE INDEX CONCURRENTLY leaves an invalid index that
+        # IF NOT EXISTS would then skip; refuse to record the migration.
+        # Only this migration's indexes count: others may be mid-rebuild.
+        cursor.execute('''
+            SELECT
+                indexrelid::regclass::text
+            FROM
+                pg_index
+            WHERE
+                indexrelid IN (SELECT to_regclass(name)
+                               FROM unnest(%s::text[]) AS name)
+                AND NOT indisvalid
+        ''', (migration.concurrent_indexes(), ))
+        invalid = [row[0] for row in cursor.fetchall()]
+        if invalid:
+            raise RuntimeError(f"Invalid indexes {', '.join(invalid)}; "
+                               f"drop them and run the migration again")
+        cursor.execute(record, values)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Apply pending schema migrations')
+    parser.add_argument('--status', action='store_true',
+                        help='list applied and pending migrations only')
+    parser.add_argument('--target', type=int,
+                        help='apply migrations up to this version')
+    args = parser.parse_args()
+
+    try:
+        migrations = load_migrations()
+        conn = psycopg2.connect(MIGRATION_URL)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', (LOCK_KEY, ))
+            applied = get_applied(cursor)
+
+        for migration in migrations:
+            if migration.version in applied:
+                if applied[migration.version] != migration.checksum:
+                    print(f'{sys.argv[0]}: warning: {migration.version:04d}'
+                          f'_{migration.name} changed since it was applied')
+                if args.status:
+                    print(f'applied  {migration.version:04d}_'
+                          f'{migration.name}')
+                continue
+            if args.target is not None and migration.version > args.target:
+                break
+            if args.status:
+                print(f'pending  {migration.version:04d}_{migration.name}')
+                continue
+
+            print(f'applying {migration.version:04d}_{migration.name}')
+            apply(conn, migration)
+
+        conn.close()
+    except Exception as ex:
+        print(f'{sys.argv[0]}: {str(ex)}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+-- Baseline schema, as used by the *_queries.py modules. IF NOT EXISTS
+-- makes this a no-op on databases created before migrations existed.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id SERIAL PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    email TEXT NOT NULL,
+    is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+    address TEXT,
+    preferred_name TEXT,
+    pronouns TEXT,
+    phone_number TEXT,
+    marital_status TEXT,
+    family_circumstance TEXT,
+    community_status TEXT,
+    interests TEXT,
+    personal_identity TEXT,
+    profile_photo TEXT
+);
+
+CREATE TABLE IF NOT EXISTS blocked_users (
+    blocked_id SERIAL PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    email TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    event_id SERIAL PRIMARY KEY,
+    event_name TEXT NOT NULL,
+    event_desc TEXT,
+    start_time TIMESTAMPTZ NOT NULL,
+    end_time TIMESTAMPTZ NOT NULL,
+    capacity INTEGER NOT NULL,
+    filled_spots INTEGER NOT NULL DEFAULT 0,
+    image_link TEXT,
+    location TEXT,
+    is_dana_event BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS event_registrations (
+    registr_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    event_id INTEGER NOT NULL REFERENCES events (event_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS event_waitlists (
+    waitlist_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    event_id INTEGER NOT NULL REFERENCES events (event_id) ON DELETE CASCADE,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS communities (
+    group_id SERIAL PRIMARY KEY,
+    group_name TEXT NOT NULL,
+    group_desc TEXT,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    image_link TEXT
+);
+
+CREATE TABLE IF NOT EXISTS community_registrations (
+    unique_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    group_id INTEGER NOT NULL
+        REFERENCES communities (group_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS announcements (
+    announcement_id SERIAL PRIMARY KEY,
+    announcement_name TEXT NOT NULL,
+    description TEXT,
+    image_link TEXT
+);
+
+CREATE TABLE IF NOT EXISTS resources (
+    resource_id SERIAL PRIMARY KEY,
+    resource TEXT NOT NULL,
+    disp_name TEXT,
+    descrip TEXT
+);
+
+CREATE TABLE IF NOT EXISTS visitor_logs (
+    log_id SERIAL PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,49 @@
+-- migrate: no-transaction
+-- Indexes behind the user lookups, listings and registration queries.
+-- Built CONCURRENTLY so production keeps serving writes meanwhile.
+
+-- USER_ID_BY_EMAIL, USER_AUTHORIZATION and every pipeline's user step
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_email_idx
+    ON users (email);
+
+-- IS_IN_BLOCK, checked on every login
+CREATE INDEX CONCURRENTLY IF NOT EXISTS blocked_users_email_idx
+    ON blocked_users (email);
+
+-- Listing joins on (event_id, user_id); registration deletes and
+-- get_users_for_event/get_event_emails filter on event_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_registrations_event_user_idx
+    ON event_registrations (event_id, user_id);
+
+-- get_registered_events and delete_user filter on user_id alone
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_registrations_user_idx
+    ON event_registrations (user_id);
+
+-- get_first_waitlist_user: the event's waitlist in joining order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_waitlists_event_timestamp_idx
+    ON event_waitlists (event_id, timestamp);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS event_waitlists_user_idx
+    ON event_waitlists (user_id);
+
+-- Community listing joins and registration deletes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS community_registrations_group_user_idx
+    ON community_registrations (group_id, user_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS community_registrations_user_idx
+    ON community_registrations (user_id);
+
+-- current_visitors and the expired-session cleanup
+CREATE INDEX CONCURRENTLY IF NOT EXISTS visitor_logs_timestamp_idx
+    ON visitor_logs (timestamp);
+
+-- Upcoming events (end_time > CURRENT_TIMESTAMP ORDER BY start_time).
+-- A partial index cannot use CURRENT_TIMESTAMP in its predicate, so the
+-- upcoming range is found by end_time, with start_time carried along.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS events_end_time_start_time_idx
+    ON events (end_time, start_time);
+
+-- Upcoming Dana events, a small fixed subset
+CREATE INDEX CONCURRENTLY IF NOT EXISTS events_dana_end_time_idx
+    ON events (end_time, start_time)
+    WHERE is_dana_event;
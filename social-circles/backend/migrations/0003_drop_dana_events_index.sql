@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- get_dana_events filters the shared upcoming listing in Python, so no
+-- query reads the partial Dana index; stop maintaining it on writes.
+
+DROP INDEX CONCURRENTLY IF EXISTS events_dana_end_time_idx;
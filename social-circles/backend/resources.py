@@ -5,7 +5,7 @@
 import sys
 import flask
 import resources_queries as res_db
-import user_queries as user_db
+import auth
 
 #----------------------------------------------------------------------
 
@@ -42,6 +42,7 @@ def get_resources() -> tuple:
             'message' : str(ex)
         }), 500 # INTERNAL SERVER ERROR
 
+@auth.require_admin
 def add_resources() -> tuple:
     """Add a resource
 
@@ -49,40 +50,30 @@ def add_resources() -> tuple:
         tuple: JSON containing request status and HTTP code
     """
     
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Check if user is authorized to perform action
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
-            
-            # Parse resource data to add sent from frontend
-            resource_data = flask.request.json
-            resource_dict = {
-                'resource' : resource_data['resource'],
-                'disp_name' : resource_data['disp_name'],
-                'descrip' : resource_data['descrip']
-            }
+    try:
+        # Parse resource data to add sent from frontend
+        resource_data = flask.request.json
+        resource_dict = {
+            'resource' : resource_data['resource'],
+            'disp_name' : resource_data['disp_name'],
+            'descrip' : resource_data['descrip']
+        }
 
-            # Send resource data to database for CREATE
-            res_db.add_resources(resource_dict)
-                
-            # Return success after adding resource
-            return flask.jsonify({
-                'status' : 'success'
-            }), 200 # OK
-        # Error from database / not admin
-        except Exception as ex:
-            print(f'resources.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Send resource data to database for CREATE
+        res_db.add_resources(resource_dict)
+            
+        # Return success after adding resource
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
+            'status' : 'success'
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'resources.py: {str(ex)}')
+        return flask.jsonify({
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
         
+@auth.require_admin
 def update_resources() -> tuple:
     """ Edit an already existing resource
 
@@ -90,41 +81,31 @@ def update_resources() -> tuple:
         tuple: JSON containing request status and HTTP code
     """
     
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Check if user is authorized to perform action
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
-            
-            # Parse resource data to be edited sent from frontend
-            resource_data = flask.request.json
-            resource_dict = {
-                'resource_id' : resource_data.get('resource_id',''),
-                'resource' : resource_data.get('resource',''),
-                'disp_name' : resource_data.get('disp_name',''),
-                'descrip' : resource_data.get('descrip','')
-            }
+    try:
+        # Parse resource data to be edited sent from frontend
+        resource_data = flask.request.json
+        resource_dict = {
+            'resource_id' : resource_data.get('resource_id',''),
+            'resource' : resource_data.get('resource',''),
+            'disp_name' : resource_data.get('disp_name',''),
+            'descrip' : resource_data.get('descrip','')
+        }
 
-            # Send resource data to database for UPDATE
-            res_db.update_resources(resource_dict)
+        # Send resource data to database for UPDATE
+        res_db.update_resources(resource_dict)
 
-            # Return success after editing resource
-            return flask.jsonify({
-                'status' : 'success'
-            }), 200 # OK
-        # Error from database / not admin
-        except Exception as ex:
-            print(f'resources.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Return success after editing resource
+        return flask.jsonify({
+            'status' : 'success'
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'resources.py: {str(ex)}')
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
     
+@auth.require_admin
 def delete_resources() -> tuple:
     """ Delete a resource
 
@@ -132,32 +113,21 @@ def delete_resources() -> tuple:
         tuple: JSON containing request status and HTTP code
     """
     
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Check if user is authorized to perform action
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
-            
-            # Parse resource data to be deleted sent from frontend
-            resource_data = flask.request.json
-            resource_id = resource_data.get('resource_id')
+    try:
+        # Parse resource data to be deleted sent from frontend
+        resource_data = flask.request.json
+        resource_id = resource_data.get('resource_id')
 
-            # Send resource data to database for DELETE
-            res_db.delete_resources(resource_id)
-                
-            # Return success after deleting resource
-            return flask.jsonify({
-                'status' : 'success'
-            }), 200 # OK
-        # Error from database / not admin
-        except Exception as ex:
-            print(f'resources.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Send resource data to database for DELETE
+        res_db.delete_resources(resource_id)
+            
+        # Return success after deleting resource
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
\ No newline at end of file
+            'status' : 'success'
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'resources.py: {str(ex)}')
+        return flask.jsonify({
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
\ No newline at end of file
@@ -12,6 +12,9 @@ import resources
 import users
 import uuid
 import user_dashboard
+import diagnostics
+import database
+import blocklist
 from datetime import datetime, timezone
 from apscheduler.schedulers.background import BackgroundScheduler
 
@@ -29,6 +32,13 @@ Session(app)
 REACT_FRONTEND = os.environ.get('REACT_FRONTEND')
 flask_cors.CORS(app, supports_credentials=True, resources={r"/*": {"origins": REACT_FRONTEND}})
 
+# Warm up the connection pool and the blocked-user set, give each
+# request a database deadline and reclaim connections leaked by
+# requests. Routes needing a budget other than DB_REQUEST_DEADLINE use
+# @database.deadline(seconds).
+database.init_app(app)
+blocklist.warm_up()
+
 last_session_init_time = None
 session_init_lock_timeout = timedelta(seconds=1)  # Timeout to prevent re-init
 
@@ -97,6 +107,7 @@ def delete_user_data():
     return users.delete_user_data()
     
 @app.route('/all-users', methods=['GET'])
+@database.deadline(20)
 def get_all_users():
     return users.get_all_users()
     
@@ -120,6 +131,22 @@ def remove_user_from_block():
 def get_current_visitors():
     return visitors.current_visitors()
 
+@app.route('/db-top-statements', methods = ['GET'])
+def get_db_top_statements():
+    return diagnostics.get_top_statements()
+
+@app.route('/db-pool-stats', methods = ['GET'])
+def get_db_pool_stats():
+    return diagnostics.get_pool_stats()
+
+@app.route('/db-leak-report', methods = ['GET'])
+def get_db_leak_report():
+    return diagnostics.get_leak_report()
+
+@app.route('/db-slow-queries', methods = ['GET'])
+def get_db_slow_queries():
+    return diagnostics.get_slow_queries()
+
 #----------------------------------------------------------------------
 
 # Routes for requesting EVENTS data from database
@@ -154,14 +181,17 @@ def delete_event():
     return events.delete_event()
 
 @app.route('/add-event-registration', methods = ['POST'])
+@database.deadline(5)
 def add_event_registration_route():
     return events.add_event_registration()
     
 @app.route('/delete-event-registration', methods = ['POST'])    
+@database.deadline(5)
 def delete_event_registration_route():
     return events.delete_event_registration()
 
 @app.route('/delete-event-waitlist', methods = ['POST'])    
+@database.deadline(5)
 def delete_event_waitlist_route():
     return events.delete_event_waitlist()
 
@@ -174,10 +204,12 @@ def get_event_info_route():
     return events.get_event_info()
 
 @app.route('/api/get-users-for-event', methods = ['GET'])
+@database.deadline(20)
 def get_users_for_event():
     return events.get_users_for_event()
 
 @app.route('/api/get-event-emails', methods = ['POST'])
+@database.deadline(20)
 def email_event_route():
     return events.get_event_emails()
 
@@ -210,10 +242,12 @@ def delete_community_route():
     return communities.delete_community()
         
 @app.route('/api/add-community-registration', methods = ['POST'])
+@database.deadline(5)
 def add_community_registration_route():
     return communities.add_community_registration()
         
 @app.route('/api/delete-community-registration', methods = ['POST'])
+@database.deadline(5)
 def delete_community_registration_route():
     return communities.delete_community_registration()
 
@@ -226,10 +260,12 @@ def get_community_info_route():
     return communities.get_community_info()
 
 @app.route('/api/get-users-for-community', methods = ['GET'])
+@database.deadline(20)
 def get_users_for_community_route():
     return communities.get_users_for_community()
 
 @app.route('/api/get-community-emails', methods = ['POST'])
+@database.deadline(20)
 def email_community_route():
     return communities.get_community_emails()
 
@@ -264,6 +300,10 @@ def update_resources_route():
 def get_announcements_route():
     return user_dashboard.get_announcements()
 
+@app.route('/api/get-dashboard', methods = ['GET'])
+def get_dashboard_route():
+    return user_dashboard.get_dashboard()
+
 @app.route('/api/add-announcement', methods = ['POST'])
 def add_announcements_route():
     return user_dashboard.add_announcement()
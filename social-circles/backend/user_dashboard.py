@@ -5,49 +5,91 @@
 import sys
 import html
 import flask
+import database
 import user_dashboard_queries as userdash_db
-import user_queries as user_db
+import event_queries as event_db
+import events
+import auth
 
 #----------------------------------------------------------------------
 
+def announcement_to_dict(announcement) -> dict:
+    """ Convert an announcement row to the dict sent to the frontend
+
+    Args:
+        announcement (tuple): Row from the announcements query
+
+    Returns:
+        dict: Announcement details
+    """
+    return {
+        'announcement_id': announcement[0],
+        'announcement_name': announcement[1],
+        'description': announcement[2],
+        'image_link' : announcement[3]
+    }
+
+@auth.require_user
 def get_announcements() -> tuple:
     """ Return all announcements
 
     Returns:
         tuple: JSON containing announcements and HTTP code
     """
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Fetch all announcements from database
-            all_announcements = userdash_db.get_announcements()
-            announcements_list = []
+    try:
+        # Fetch all announcements from database
+        all_announcements = userdash_db.get_announcements()
+
+        # Prepare list of dicts containing all announcements
+        announcements_list = [announcement_to_dict(announcement)
+                              for announcement in all_announcements]
             
-            # Prepare list of dicts containing all announcements
-            for announcement in all_announcements:
-                announcement_dict = {
-                    'announcement_id': announcement[0],
-                    'announcement_name': announcement[1],
-                    'description': announcement[2],
-                    'image_link' : announcement[3]
-                }
-                announcements_list.append(announcement_dict)
-                
-            # Return list of all annnouncements
-            return flask.jsonify({
-                'results' : announcements_list
-            }), 200 # OK
-        # Error from database
-        except Exception as ex:
-            print(f'user_dashboard.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Return list of all annnouncements
+        return flask.jsonify({
+            'results' : announcements_list
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'user_dashboard.py: {str(ex)}')
+        return flask.jsonify({
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
+
+@auth.require_user
+def get_dashboard() -> tuple:
+    """ Return the events and announcements the user dashboard shows in
+        one response. The two queries run in parallel, so the response
+        takes as long as the slower query rather than both combined.
+
+    Returns:
+        tuple: JSON containing events, announcements and HTTP code
+    """
+    try:
+        # Fetch all dashboard data from database at the same time
+        user_id = auth.current_user_id()
+        all_events, all_announcements = database.fan_out([
+            (event_db.get_available_events, user_id),
+            (userdash_db.get_announcements, )
+        ])
+
+        # Return dicts for every section of the dashboard
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
+            'results' : {
+                'available_events' : [events.event_to_dict(event)
+                                      for event in all_events],
+                'announcements' : [
+                    announcement_to_dict(announcement)
+                    for announcement in all_announcements]
+            }
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'user_dashboard.py: {str(ex)}')
+        return flask.jsonify({
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
 
+@auth.require_admin
 def add_announcement() -> tuple:
     """ Add an announcement
 
@@ -56,40 +98,30 @@ def add_announcement() -> tuple:
         tuple: JSON containing request status and HTTP code
     """
     
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Check if user is authorized to perform action
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
-            
-            # Parse announcement data to add sent from frontend
-            announcement_data = flask.request.json
-            announcement_dict = {
-                'announcement_name' : html.escape(announcement_data['announcement_name']),
-                'description' : html.escape(announcement_data['description']),
-                'image_link' : html.escape(announcement_data['image_link'])
-            }
+    try:
+        # Parse announcement data to add sent from frontend
+        announcement_data = flask.request.json
+        announcement_dict = {
+            'announcement_name' : html.escape(announcement_data['announcement_name']),
+            'description' : html.escape(announcement_data['description']),
+            'image_link' : html.escape(announcement_data['image_link'])
+        }
 
-            # Send announcement data to database for CREATE
-            userdash_db.add_announcement(announcement_dict)
-            
-            # Return success after adding announcement
-            return flask.jsonify({
-                'status' : 'success'
-            }), 200 # OK
-        # Error from database
-        except Exception as ex:
-            print(f'user_dashboard.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Send announcement data to database for CREATE
+        userdash_db.add_announcement(announcement_dict)
+        
+        # Return success after adding announcement
+        return flask.jsonify({
+            'status' : 'success'
+        }), 200 # OK
+    # Error from database
+    except Exception as ex:
+        print(f'user_dashboard.py: {str(ex)}')
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
 
+@auth.require_admin
 def update_announcement() -> tuple:
     """ Edit an already existing announcement
 
@@ -97,41 +129,31 @@ def update_announcement() -> tuple:
         tuple: JSON containing request status and HTTP code
     """
     
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Check if user is authorized to perform action
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
-            
-            # Parase announcement data to be edited sent from frontend
-            announcement_data = flask.request.json
-            announcement_dict = {
-                'announcement_id' : announcement_data.get('announcement_id',''),
-                'announcement_name' : html.escape(announcement_data.get('announcement_name','')),
-                'description' : html.escape(announcement_data.get('description','')),
-                'image_link' : html.escape(announcement_data.get('image_link', ''))
-            }
+    try:
+        # Parase announcement data to be edited sent from frontend
+        announcement_data = flask.request.json
+        announcement_dict = {
+            'announcement_id' : announcement_data.get('announcement_id',''),
+            'announcement_name' : html.escape(announcement_data.get('announcement_name','')),
+            'description' : html.escape(announcement_data.get('description','')),
+            'image_link' : html.escape(announcement_data.get('image_link', ''))
+        }
 
-            # Send announcement data to database for UPDATE
-            userdash_db.update_announcement(announcement_dict)
-                
-            # Return success after editing announcement
-            return flask.jsonify({
-                'status' : 'success'
-            }), 200 # OK
-        # Error from database / ot admin
-        except Exception as ex:
-            print(f'user_dashboard.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Send announcement data to database for UPDATE
+        userdash_db.update_announcement(announcement_dict)
+            
+        # Return success after editing announcement
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
+            'status' : 'success'
+        }), 200 # OK
+    # Error from database / ot admin
+    except Exception as ex:
+        print(f'user_dashboard.py: {str(ex)}')
+        return flask.jsonify({
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
         
+@auth.require_admin
 def delete_announcement() -> tuple:
     """ Delete an announcement
     
@@ -139,32 +161,21 @@ def delete_announcement() -> tuple:
         tuple: JSON containing request status and HTTP code
     """
     
-    # Check if user is authenticated
-    if 'email' in flask.session:
-        try:
-            # Check if user is authorized to perform action
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
+    try:
+        # Parse announcement data to be deleted sent from frontend
+        announcement_data = flask.request.json
+        announcement_id = announcement_data.get('announcement_id')
+
+        # Send announcement data to database for DELETE
+        userdash_db.delete_announcement(announcement_id)
             
-            # Parse announcement data to be deleted sent from frontend
-            announcement_data = flask.request.json
-            announcement_id = announcement_data.get('announcement_id')
-
-            # Send announcement data to database for DELETE
-            userdash_db.delete_announcement(announcement_id)
-                
-            # Return success after deleting announcement
-            return flask.jsonify({
-                'status' : 'success'
-            }), 200 # OK
-        # Database error
-        except Exception as ex:
-            print(f'user_dashboard.py: {str(ex)}')
-            return flask.jsonify({
-                'message' : str(ex)
-            }), 500 # INTERNAL SERVER ERROR
-    else:
+        # Return success after deleting announcement
+        return flask.jsonify({
+            'status' : 'success'
+        }), 200 # OK
+    # Database error
+    except Exception as ex:
+        print(f'user_dashboard.py: {str(ex)}')
         return flask.jsonify({
-            'message' : 'User not authenticated.'
-        }), 401 # UNAUTHORIZED
\ No newline at end of file
+            'message' : str(ex)
+        }), 500 # INTERNAL SERVER ERROR
\ No newline at end of file
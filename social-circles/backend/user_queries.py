@@ -2,37 +2,107 @@
 # user_queries.py: SQL Queries for Social Circles Users
 #----------------------------------------------------------------------
 
-import psycopg2
-from database import get_connection, put_connection
+import database as db
 
+#----------------------------------------------------------------------
+
+# Hot statements run on nearly every request, prepared once per connection
+USER_ID_BY_EMAIL = db.prepare('user_id_by_email', '''
+    SELECT
+        user_id
+    FROM
+        users
+    WHERE
+        users.email = %s
+''')
+
+# Everything the auth decorators check, in one row even for emails
+# without an account
+USER_IDENTITY = db.prepare('user_identity', '''
+    SELECT
+        users.user_id,
+        COALESCE(users.is_admin, FALSE),
+        EXISTS(
+            SELECT 1 FROM blocked_users WHERE blocked_users.email = %s
+        )
+    FROM
+        (SELECT 1) AS one
+    LEFT JOIN
+        users
+    ON
+        users.email = %s
+''')
+
+# USER_IDENTITY for users the in-process blocklist has already cleared
+USER_ACCOUNT = db.prepare('user_account', '''
+    SELECT
+        users.user_id,
+        COALESCE(users.is_admin, FALSE),
+        FALSE
+    FROM
+        (SELECT 1) AS one
+    LEFT JOIN
+        users
+    ON
+        users.email = %s
+''')
+
+#----------------------------------------------------------------------
+
+def identity_key(email: str) -> str:
+    """ Name invalidated when a user's identity (account, admin flag or
+        blocked status) changes, so sessions drop their cached copy
+
+    Args:
+        email (str): email of the user
+
+    Returns:
+        str: key for db.invalidate_on_commit() / db.changed_since()
+    """
+    return f'identity:{email}'
+
+# Small, and dropped whenever the users table is written (e.g. by
+# delete_user / block_and_delete_user), so an id never outlives its user
+@db.cached(('users', ))
+@db.retry
+def get_user_id(email: str) -> int:
+    """ Resolve a user's email to their user_id, for callers that do not
+        have the id from the session
+
+    Args:
+        email (str): email of the user
+
+    Returns:
+        int: user_id, or None if there is no such user
+    """
+    with db.read() as cursor:
+        db.execute_prepared(cursor, USER_ID_BY_EMAIL, (email, ))
+        user_info = cursor.fetchone()
+    return user_info[0] if user_info else None
+
+@db.retry
 def get_user_details(email: str) -> list:
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT 
-                    *
-                FROM 
-                    users
-                WHERE 
-                    email = %s
-            ''', (email,))
-            
-            user_row = cursor.fetchone()
-            
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-    
+    with db.read() as cursor:
+        # Retrieve user information from their email
+        cursor.execute('''
+            SELECT
+                *
+            FROM
+                users
+            WHERE
+                email = %s
+        ''', (email,))
+
+        user_row = cursor.fetchone()
+
     # return all user information
     if user_row:
         return {
+            'user_id' : user_row[0],
             'first_name' : user_row[1],
             'last_name' : user_row[2],
             'email': user_row[3],
-            'is_admin': user_row[4],  
+            'is_admin': user_row[4],
             'address' : user_row[5],
             'preferred_name' : user_row[6],
             'pronouns' : user_row[7],
@@ -44,320 +114,250 @@ def get_user_details(email: str) -> list:
             'personal_identity' : user_row[13]
         }
 
-# Get user authorization (regular user / admin)
-def get_user_authorization(email: str) -> bool:
-    is_admin = False
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    users.is_admin
-                FROM 
-                    users
-                WHERE 
-                    users.email = %s
-            ''', (email,))
-            authorization_status = cursor.fetchone()
-            
-            # Need to change this eventually since all users will be
-            # forced to register and therefore will always have an
-            # authorization statues.
-            if authorization_status:
-                is_admin = authorization_status[0]
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-    return is_admin
-
-def add_user(args: dict) -> None:
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Initialize lists to hold SQL columns and corresponding values
-            columns = []
-            values = []
-            # Check each field in args and add non-empty values to lists
-            for field in ['first_name', 'last_name', 'email', 'address', 
-                          'preferred_name', 'pronouns', 'phone_number', 
-                          'marital_status', 'family_circumstance', 
-                          'community_status', 'interests', 'personal_identity', 'profile_photo']:
-                if args.get(field):
-                    columns.append(field)
-                    values.append(args[field])
-            
-            # Construct the SQL query dynamically based on non-empty values
-            sql = f'''
-                INSERT INTO users ({', '.join(columns)})
-                VALUES ({', '.join(['%s'] * len(columns))})
-            '''
-            
-            # Execute the query with the non-empty values
-            cursor.execute(sql, tuple(values))
-            connection.commit()
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
-
+@db.retry
+def get_identity(email: str, check_blocked: bool = True) -> dict:
+    """ Get a user's id, admin flag and blocked status in one query
+
+    Args:
+        email (str): email of the user
+        check_blocked (bool): False if the user is known not to be
+            blocked, skipping the blocked_users lookup
+
+    Returns:
+        dict: user_id (None without an account), is_admin and blocked
+    """
+    with db.read() as cursor:
+        if check_blocked:
+            db.execute_prepared(cursor, USER_IDENTITY, (email, email))
+        else:
+            db.execute_prepared(cursor, USER_ACCOUNT, (email, ))
+        user_id, is_admin, blocked = cursor.fetchone()
+    return {'user_id': user_id, 'is_admin': is_admin, 'blocked': blocked}
+
+@db.retry
+def add_user(args: dict) -> int:
+    with db.transaction() as cursor:
+        # Initialize lists to hold SQL columns and corresponding values
+        columns = []
+        values = []
+        # Check each field in args and add non-empty values to lists
+        for field in ['first_name', 'last_name', 'email', 'address',
+                      'preferred_name', 'pronouns', 'phone_number',
+                      'marital_status', 'family_circumstance',
+                      'community_status', 'interests', 'personal_identity', 'profile_photo']:
+            if args.get(field):
+                columns.append(field)
+                values.append(args[field])
+
+        # Construct the SQL query dynamically based on non-empty values
+        sql = f'''
+            INSERT INTO users ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+            RETURNING user_id
+        '''
+
+        # Execute the query with the non-empty values
+        cursor.execute(sql, tuple(values))
+        db.invalidate_on_commit(cursor, identity_key(args['email']))
+
+        # Return the new user's id, kept in their session
+        return cursor.fetchone()[0]
+
+@db.retry
 def update_user(args: dict):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT DISTINCT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
-            ''', (args['email'], ))
-            user_info = cursor.fetchone()
-
-            if user_info is None:
-                raise ValueError("User not found.")
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-
-
-            # Dictionary of field mappings
-            field_map = {
-                'first_name': 'first_name',
-                'last_name': 'last_name',
-                'email': 'email',  # This should remain constant as it's used in WHERE clause
-                'address': 'address',
-                'preferred_name': 'preferred_name',
-                'pronouns': 'pronouns',
-                'phone_number': 'phone_number',
-                'marital_status': 'marital_status',
-                'family_circumstance': 'family_circumstance',
-                'community_status': 'community_status',
-                'interests': 'interests',
-                'personal_identity': 'personal_identity',
-                'profile_photo' : 'profile_photo'
-            }
-
-            # Filtering out empty values and preparing SQL parts
-            update_fields = []
-            update_values = []
-            for key, db_field in field_map.items():
-                if key in args and args[key]:
-                    update_fields.append(f"{db_field} = %s")
-                    update_values.append(args.get(key))
-
-            # Construct the dynamic SQL query
-            if update_fields:
-                sql = f"UPDATE users SET {', '.join(update_fields)} WHERE user_id = %s"
-                update_values.append(user_id)
-
-                # Execute the update query
-                cursor.execute(sql, tuple(update_values))
-                connection.commit()
-    except Exception:
-        raise
-    finally:
-        put_connection(connection)
+    with db.transaction() as cursor:
+        # Retrieve user information from their email
+        db.execute_prepared(cursor, USER_ID_BY_EMAIL, (args['email'], ))
+        user_info = cursor.fetchone()
+
+        if user_info is None:
+            raise ValueError("User not found.")
+
+        # Retrieve user's user_id at index 0
+        user_id = user_info[0]
+
+
+        # Dictionary of field mappings
+        field_map = {
+            'first_name': 'first_name',
+            'last_name': 'last_name',
+            'email': 'email',  # This should remain constant as it's used in WHERE clause
+            'address': 'address',
+            'preferred_name': 'preferred_name',
+            'pronouns': 'pronouns',
+            'phone_number': 'phone_number',
+            'marital_status': 'marital_status',
+            'family_circumstance': 'family_circumstance',
+            'community_status': 'community_status',
+            'interests': 'interests',
+            'personal_identity': 'personal_identity',
+            'profile_photo' : 'profile_photo'
+        }
 
+        # Filtering out empty values and preparing SQL parts
+        update_fields = []
+        update_values = []
+        for key, db_field in field_map.items():
+            if key in args and args[key]:
+                update_fields.append(f"{db_field} = %s")
+                update_values.append(args.get(key))
+
+        # Construct the dynamic SQL query
+        if update_fields:
+            sql = f"UPDATE users SET {', '.join(update_fields)} WHERE user_id = %s"
+            update_values.append(user_id)
+
+            # Execute the update query
+            cursor.execute(sql, tuple(update_values))
+
+# Pipeline steps deleting the user chosen by an earlier 'target' step
+# along with their registrations. Spots and member counts are read from
+# the registrations before they are removed, since all steps share one
+# snapshot.
+_DELETE_USER_STEPS = [
+    # Reduce filled_spots in events where the user is registered
+    ('event_spots', '''
+        UPDATE events
+        SET filled_spots = filled_spots - 1
+        WHERE event_id IN (
+            SELECT event_id
+            FROM event_registrations
+            WHERE user_id IN (SELECT user_id FROM target)
+        )
+        RETURNING event_id
+    ''', ()),
+    # Reduce member_count in communities where the user is registered
+    ('member_counts', '''
+        UPDATE communities
+        SET member_count = member_count - 1
+        WHERE group_id IN (
+            SELECT group_id
+            FROM community_registrations
+            WHERE user_id IN (SELECT user_id FROM target)
+        )
+        RETURNING group_id
+    ''', ()),
+    # Dependent tables
+    ('removed_event_registrations', '''
+        DELETE FROM event_registrations
+        WHERE user_id IN (SELECT user_id FROM target)
+        RETURNING event_id
+    ''', ()),
+    ('removed_community_registrations', '''
+        DELETE FROM community_registrations
+        WHERE user_id IN (SELECT user_id FROM target)
+        RETURNING group_id
+    ''', ()),
+    ('removed_waitlists', '''
+        DELETE FROM event_waitlists
+        WHERE user_id IN (SELECT user_id FROM target)
+        RETURNING event_id
+    ''', ()),
+    # Delete from users table
+    ('removed_user', '''
+        DELETE FROM users
+        WHERE user_id IN (SELECT user_id FROM target)
+        RETURNING user_id
+    ''', ())
+]
+
+@db.retry
 def delete_user(email: str):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user information from their email
-            cursor.execute('''
-                SELECT DISTINCT
-                    user_id
-                FROM
-                    users
-                WHERE
-                    users.email = %s               
+    # All changes are sent in one round trip and committed together
+    with db.transaction() as cursor:
+        results = db.pipeline(cursor, [
+            ('target', '''
+                SELECT user_id
+                FROM users
+                WHERE email = %s
             ''', (email, ))
-            user_info = cursor.fetchone()
-
-            if user_info is None:
-                raise ValueError("User not found.")
-            
-            # Retrieve user's user_id at index 0
-            user_id = user_info[0]
-
-            # Start transaction
-            # Reduce filled_spots in events where the user is registered
-            cursor.execute('''
-                UPDATE events
-                SET filled_spots = filled_spots - 1
-                WHERE event_id IN (
-                    SELECT event_id
-                    FROM event_registrations
-                    WHERE user_id = %s
-                )
-            ''', (user_id,))
-
-            # Reduce filled_spots in communities where the user is registered
-            cursor.execute('''
-                UPDATE communities
-                SET member_count = member_count - 1
-                WHERE group_id IN (
-                    SELECT group_id
-                    FROM community_registrations
-                    WHERE user_id = %s
-                )
-            ''', (user_id,))
-
-            # Execute the DELETE statement to remove the user
-
-            # Dependent tables
-            dependent_tables = ['event_registrations', 'community_registrations', 'event_waitlists']
-            for table in dependent_tables:
-                cursor.execute(f'''
-                    DELETE FROM 
-                        {table}
-                    WHERE 
-                        user_id = %s
-                ''', (user_id,))
-
-            # Delete from users table
-            cursor.execute('''
-                DELETE FROM 
-                    users
-                WHERE 
-                    user_id = %s
-            ''', (user_id,))
-
-            # Commit all changes
-            connection.commit()
-    except Exception as e:
-        connection.rollback()  # Rollback in case of any error
-        raise e
-    finally:
-        put_connection(connection)
+        ] + _DELETE_USER_STEPS)
+
+        if not results['target']:
+            raise ValueError("User not found.")
+        db.invalidate_on_commit(cursor, identity_key(email))
 
 
+@db.retry
 def get_all_user_details() -> list:
     all_user_details = []
-    connection = get_connection()
-    try:
-        # Retrieve information from all users
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    *
-                FROM 
-                    users
-            ''')
-
-            user_rows = cursor.fetchall()
-            
-            # return information from all users
-            for user_row in user_rows:
-                user_details = {
-                    'user_id': user_row[0],
-                    'first_name': user_row[1],
-                    'last_name': user_row[2],
-                    'email': user_row[3],
-                    'is_admin': user_row[4],  
-                    'address': user_row[5],
-                    'preferred_name': user_row[6],
-                    'pronouns': user_row[7],
-                    'phone_number': user_row[8],
-                    'marital_status': user_row[9],
-                    'family_circumstance': user_row[10],
-                    'community_status': user_row[11],
-                    'interests': user_row[12],
-                    'personal_identity': user_row[13]
-                }
-                all_user_details.append(user_details)
-    except Exception as e:
-        raise e
-    finally:
-        put_connection(connection)
-    
+    # Retrieve information from all users
+    with db.read() as cursor:
+        cursor.execute('''
+            SELECT
+                *
+            FROM
+                users
+        ''')
+
+        user_rows = cursor.fetchall()
+
+        # return information from all users
+        for user_row in user_rows:
+            user_details = {
+                'user_id': user_row[0],
+                'first_name': user_row[1],
+                'last_name': user_row[2],
+                'email': user_row[3],
+                'is_admin': user_row[4],
+                'address': user_row[5],
+                'preferred_name': user_row[6],
+                'pronouns': user_row[7],
+                'phone_number': user_row[8],
+                'marital_status': user_row[9],
+                'family_circumstance': user_row[10],
+                'community_status': user_row[11],
+                'interests': user_row[12],
+                'personal_identity': user_row[13]
+            }
+            all_user_details.append(user_details)
+
     return all_user_details
 
 
+@db.retry
 def block_and_delete_user(email: str):
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # Retrieve user's details before deleting
-            cursor.execute('''
-                SELECT first_name, last_name, email
+    with db.transaction() as cursor:
+        # Add user to block and delete them in the same round trip
+        results = db.pipeline(cursor, [
+            ('target', '''
+                SELECT user_id, first_name, last_name, email
                 FROM users
                 WHERE email = %s
-            ''', (email,))
-            user_details = cursor.fetchone()
-
-            if user_details is None:
-                raise ValueError("User not found.")
-
-            # Add user to block
-            cursor.execute('''
+            ''', (email, )),
+            ('blocked', '''
                 INSERT INTO blocked_users (first_name, last_name, email)
-                VALUES (%s, %s, %s)
-            ''', (user_details[0], user_details[1], user_details[2]))
-            # Commit changes
-            connection.commit()
+                SELECT first_name, last_name, email
+                FROM target
+                RETURNING email
+            ''', ())
+        ] + _DELETE_USER_STEPS)
 
-            # Delete user from the users table
-            delete_user(email)
-    except Exception as e:
-        connection.rollback()  # Rollback in case of any error
-        raise e
-    finally:
-        put_connection(connection)
+        if not results['target']:
+            raise ValueError("User not found.")
+        db.invalidate_on_commit(cursor, identity_key(email))
 
 
+@db.cached(('blocked_users', ))
+@db.retry
 def get_all_blocked_users():
-    connection = get_connection()
-    try:
-        with connection.cursor() as cursor:
-            # grab information for all blocked users
-            cursor.execute('''
-                SELECT first_name, last_name, email
-                FROM blocked_users
-            ''')
-            blocked_users = cursor.fetchall()
-    except Exception as e:
-        raise e
-    finally:
-        put_connection(connection)
+    with db.read() as cursor:
+        # grab information for all blocked users
+        cursor.execute('''
+            SELECT first_name, last_name, email
+            FROM blocked_users
+        ''')
+        blocked_users = cursor.fetchall()
 
     return [{'first_name': user[0], 'last_name': user[1], 'email': user[2]} for user in blocked_users]
 
 
+@db.retry
 def remove_user_from_block(email: str):
-    connection = get_connection()
-    try:
-        # delete specified user from blocked user list
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                DELETE FROM blocked_users
-                WHERE email = %s
-            ''', (email,))
-            connection.commit()
-    except Exception as e:
-        connection.rollback()  # Rollback in case of any error
-        raise e
-    finally:
-        put_connection(connection)
-
-def is_in_block(email: str) -> bool:
-    connection = get_connection()
-    try:
-        # check if user is in blocked_users table
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT EXISTS(
-                    SELECT 1 FROM blocked_users WHERE email = %s
-                )
-            ''', (email,))
-            is_blocked = cursor.fetchone()[0]
-    except Exception as e:
-        print(f"Error checking if user is in block: {e}")
-        raise
-    finally:
-        put_connection(connection)
-
-    # return true if user is in blocked_users table
-    return is_blocked
+    # delete specified user from blocked user list
+    with db.transaction() as cursor:
+        cursor.execute('''
+            DELETE FROM blocked_users
+            WHERE email = %s
+        ''', (email,))
+        db.invalidate_on_commit(cursor, identity_key(email))
@@ -1,32 +1,22 @@
 import flask
 import visitor_queries as vistor_db
-import user_queries as user_db
+import auth
 
 
 def log_visit(session_id):
     vistor_db.log_visit(session_id)
 
+@auth.require_admin
 def current_visitors():
-    if 'email' in flask.session:
-        try:
-            # checks if is admin
-            is_admin = user_db.get_user_authorization(flask.session['email'])
-            if not is_admin:
-                raise Exception("User is not authorized!")
-            
-            # grabs current number of visitors (within last 24 hours)
-            return flask.jsonify(vistor_db.current_visitors()), 200
-        except Exception as ex:
-            print(ex)
-            return flask.jsonify({
-                'status': 'error',
-                'message': str(ex)
-            }), 500 # internal server error
-    else:
+    try:
+        # grabs current number of visitors (within last 24 hours)
+        return flask.jsonify(vistor_db.current_visitors()), 200
+    except Exception as ex:
+        print(ex)
         return flask.jsonify({
-            'status' : 'error',
-            'message': 'User not Auth'
-        }), 401 # unauthorized
+            'status': 'error',
+            'message': str(ex)
+        }), 500 # internal server error
 
 def delete_expired_sessions_from_database():
     vistor_db.delete_expired_sessions_from_database()
\ No newline at end of file
@@ -25,8 +25,10 @@ function EventContextProvider({ children }) {
     setQuery("");
   }, [location]);
 
-  /* Fetch events from the parameter backend route */
-  const fetchEvents = useCallback(async (route) => {
+  /* Fetch events from the parameter backend route. Routes answering
+     with more than a list of events pass a function picking the events
+     out of the results; the whole response is returned to the caller. */
+  const fetchEvents = useCallback(async (route, pickEvents = (results) => results) => {
     try {
       setIsFetching(true);
       const response = await fetch(
@@ -37,7 +39,8 @@ function EventContextProvider({ children }) {
       );
       if (response.ok) { // Fetch successful, store events
         const data = await response.json();
-        setEvents(data.results);
+        setEvents(pickEvents(data.results));
+        return data;
       } else { // Connected to server, but server error
         setDisplayAlert({ 
           type: "danger",
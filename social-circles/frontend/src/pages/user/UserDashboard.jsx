@@ -35,10 +35,22 @@ function UserDashboard() {
 
 
   useEffect(() => {
-    fetchEvents("/get-available-events");
-    fetchAllAnnouncements();
+    fetchDashboard();
   }, []);
 
+  /* Load events and announcements together in one request */
+  const fetchDashboard = async () => {
+    setIsQuerying(true);
+    const data = await fetchEvents(
+      "/api/get-dashboard",
+      (results) => results.available_events
+    );
+    if (data) {
+      setAnnouncements(data.results.announcements);
+    }
+    setIsQuerying(false);
+  };
+
   const fetchAllEvents = () => fetchEvents("/get-available-events");
 
   const fetchAllAnnouncements = async () => {